@@ -0,0 +1,67 @@
+import supervision as sv
+
+import time
+import argparse
+import numpy as np
+
+from tools.annotators import AnnotationCache, box_annotations
+
+
+CLASS_NAMES = ['person', 'bicycle', 'car', 'motorcycle', 'bus', 'truck']
+
+
+def synthetic_tracks(count: int, width: int, height: int, seed: int = 0) -> tuple[sv.Detections, list[str]]:
+    """ Random boxes with class and tracker ids, and their labels """
+    rng = np.random.default_rng(seed)
+    x1 = rng.uniform(0, width - 40, count)
+    y1 = rng.uniform(0, height - 40, count)
+    w = rng.uniform(20, 200, count)
+    h = rng.uniform(20, 200, count)
+    xyxy = np.stack([x1, y1, np.minimum(x1 + w, width - 1), np.minimum(y1 + h, height - 1)], axis=1)
+    class_id = rng.integers(0, len(CLASS_NAMES), count)
+    tracker_id = rng.integers(1, 1000, count)
+
+    tracks = sv.Detections(
+        xyxy=xyxy,
+        confidence=rng.uniform(0.5, 1.0, count),
+        class_id=class_id,
+        tracker_id=tracker_id
+    )
+    labels = [f"{CLASS_NAMES[c]} - {t}" for c, t in zip(class_id, tracker_id)]
+
+    return tracks, labels
+
+
+def time_per_frame(function: callable, scene: np.ndarray, repeat: int) -> float:
+    """ Mean milliseconds per call, on a fresh copy of the scene """
+    function(scene.copy())
+    elapsed = 0.0
+    for _ in range(repeat):
+        frame = scene.copy()
+        start = time.perf_counter()
+        function(frame)
+        elapsed += time.perf_counter() - start
+
+    return 1000 * elapsed / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='box_annotations per-frame cost')
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--size', type=int, nargs=2, default=[1920, 1080], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    width, height = args.size
+    scene = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+    print(f"{'boxes':>6} {'uncached ms':>12} {'cached ms':>10} {'sprites ms':>11}")
+    for count in args.counts:
+        tracks, labels = synthetic_tracks(count, width, height)
+        cache = AnnotationCache()
+        sprite_cache = AnnotationCache(sprites=True)
+
+        uncached = time_per_frame(lambda frame: box_annotations(frame, tracks, labels), scene, args.repeat)
+        cached = time_per_frame(lambda frame: box_annotations(frame, tracks, labels, cache), scene, args.repeat)
+        sprites = time_per_frame(lambda frame: box_annotations(frame, tracks, labels, sprite_cache), scene, args.repeat)
+        print(f"{count:>6} {uncached:>12.3f} {cached:>10.3f} {sprites:>11.3f}")
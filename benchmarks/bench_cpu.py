@@ -0,0 +1,59 @@
+import supervision as sv
+
+import time
+import argparse
+import itertools
+
+from tools.cpu_profile import EXPORT_FORMATS, inference_size, load_model, set_cpu_threads
+from tools.frame_source import FrameSource
+from tools.pipeline import FramePipeline
+
+
+def read_frames(source: str, count: int) -> list:
+    """ First count frames of the video, decoded once for all configurations """
+    frame_source = FrameSource(source)
+    frames = []
+    for frame_number in range(count):
+        success, image = frame_source.read(frame_number)
+        if not success:
+            break
+        frames.append(image)
+    frame_source.release()
+
+    return frames
+
+
+def time_configuration(frames: list, weights: str, device: str, imgsz: int, threads: int, half_resolution: bool, export_format: str) -> float:
+    """ Mean inference milliseconds per frame of one configuration, after a warm-up frame """
+    set_cpu_threads(threads)
+    size = inference_size(imgsz, half_resolution)
+    pipeline = FramePipeline(load_model(weights, export_format, size), sv.ByteTrack())
+    pipeline.imgsz = size
+    pipeline.device = device
+
+    pipeline.detect(frames[0])
+    start = time.perf_counter()
+    for image in frames:
+        pipeline.detect(image)
+
+    return 1000 * (time.perf_counter() - start) / len(frames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inference ms/frame of CPU profile configurations')
+    parser.add_argument('source', help='video file')
+    parser.add_argument('--weights', default='weights/yolov8m.pt')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--exports', nargs='+', default=['pt', *EXPORT_FORMATS], help="model formats, 'pt' for the weights")
+    args = parser.parse_args()
+
+    frames = read_frames(args.source, args.frames)
+
+    print(f"{'format':>9} {'threads':>8} {'imgsz':>6} {'ms/frame':>9}")
+    for export_format, threads, half_resolution in itertools.product(args.exports, args.threads, [False, True]):
+        export = None if export_format == 'pt' else export_format
+        milliseconds = time_configuration(frames, args.weights, args.device, args.imgsz, threads, half_resolution, export)
+        print(f"{export_format:>9} {threads:>8} {inference_size(args.imgsz, half_resolution):>6} {milliseconds:>9.1f}")
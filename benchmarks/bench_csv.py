@@ -0,0 +1,51 @@
+import time
+import argparse
+import tempfile
+import pathlib
+
+from benchmarks.bench_annotations import CLASS_NAMES, synthetic_tracks
+from tools.write_csv import ResultsWriter, csv_tracks_list, write_csv
+
+
+def time_legacy(save_path: str, frames: list, class_names: dict, total_frames: int) -> float:
+    """ Seconds to write the tracks of total_frames frames with csv_tracks_list and write_csv """
+    start = time.perf_counter()
+    for frame_number in range(total_frames):
+        data = csv_tracks_list([], frame_number, frames[frame_number % len(frames)], class_names)
+        write_csv(save_path, data)
+
+    return time.perf_counter() - start
+
+
+def time_results_writer(save_path: str, frames: list, class_names: dict, total_frames: int) -> float:
+    """ Seconds to write the tracks of total_frames frames with ResultsWriter """
+    start = time.perf_counter()
+    with ResultsWriter(save_path, class_names, mode='w') as results_writer:
+        for frame_number in range(total_frames):
+            results_writer.write_tracks(frame_number, frames[frame_number % len(frames)])
+
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tracks CSV writing rows per second')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='total rows written')
+    parser.add_argument('--per-frame', type=int, default=50, help='tracks per frame')
+    args = parser.parse_args()
+
+    class_names = dict(enumerate(CLASS_NAMES))
+    frames = [synthetic_tracks(args.per_frame, 1920, 1080, seed)[0] for seed in range(16)]
+    total_frames = args.rows // args.per_frame
+    rows = total_frames * args.per_frame
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_path = pathlib.Path(directory) / 'legacy.csv'
+        writer_path = pathlib.Path(directory) / 'writer.csv'
+        legacy = time_legacy(str(legacy_path), frames, class_names, total_frames)
+        streaming = time_results_writer(str(writer_path), frames, class_names, total_frames)
+        same_output = legacy_path.read_bytes() == writer_path.read_bytes()
+
+    print(f"{'writer':>14} {'seconds':>8} {'rows/s':>11}")
+    print(f"{'write_csv':>14} {legacy:>8.2f} {rows / legacy:>11.0f}")
+    print(f"{'ResultsWriter':>14} {streaming:>8.2f} {rows / streaming:>11.0f}")
+    print(f"{rows} rows, same output: {same_output}")
@@ -0,0 +1,72 @@
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtGui import QImage, QPixmap, QPainter
+from PySide6.QtCore import Qt
+
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+from components.ui_video_view import UI_VideoView
+
+
+def convert_cv_qt(cv_img):
+    """ Previous display path of MainWindow: RGB conversion, QImage and QPixmap copy """
+    rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb_image.shape
+    bytes_per_line = ch * w
+    convert_to_qt_format = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+    return QPixmap.fromImage(convert_to_qt_format)
+
+
+def old_path(frame: np.ndarray, canvas: QImage) -> None:
+    """ convert_cv_qt followed by the smooth scaling QLabel does on paint """
+    pixmap = convert_cv_qt(frame).scaled(canvas.width(), canvas.height(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+    painter = QPainter(canvas)
+    painter.drawPixmap(0, 0, pixmap)
+    painter.end()
+
+
+def new_path(view: UI_VideoView, frame: np.ndarray, canvas: QImage) -> None:
+    """ UI_VideoView: scale into the reused buffer, BGR888 wrap and paint """
+    image = view.prepare(frame)
+    painter = QPainter(canvas)
+    painter.drawImage(0, 0, image)
+    painter.end()
+
+
+def time_per_frame(function: callable, frames: list[np.ndarray]) -> float:
+    function(frames[0])
+    start = time.perf_counter()
+    for frame in frames:
+        function(frame)
+
+    return 1000 * (time.perf_counter() - start) / len(frames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Frame display path, convert_cv_qt against UI_VideoView')
+    parser.add_argument('--size', type=int, nargs=2, default=[1920, 1080], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--view', type=int, nargs=2, default=[1080, 612], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (args.size[1], args.size[0], 3), dtype=np.uint8) for _ in range(4)]
+    frames = [frames[index % len(frames)] for index in range(args.frames)]
+
+    view = UI_VideoView(None, size=tuple(args.view))
+    canvas = QImage(args.view[0], args.view[1], QImage.Format.Format_RGB32)
+
+    old_ms = time_per_frame(lambda frame: old_path(frame, canvas), frames)
+    new_ms = time_per_frame(lambda frame: new_path(view, frame, canvas), frames)
+
+    print(f"frame {args.size[0]}x{args.size[1]} -> view {args.view[0]}x{args.view[1]}")
+    print(f"convert_cv_qt: {old_ms:.3f} ms/frame")
+    print(f"UI_VideoView:  {new_ms:.3f} ms/frame ({old_ms / new_ms:.1f}x)")
@@ -0,0 +1,53 @@
+import time
+import argparse
+import numpy as np
+
+from tools.frame_source import FrameSource
+from tools.keyframe_index import KeyframeIndex
+
+
+def time_seeks(frame_source: FrameSource, targets: np.ndarray) -> np.ndarray:
+    """ Milliseconds to read each target frame after a jump """
+    times = []
+    for frame_number in targets:
+        start = time.perf_counter()
+        frame_source.read(int(frame_number))
+        times.append(1000 * (time.perf_counter() - start))
+
+    return np.array(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Random seek time without and with a keyframe index')
+    parser.add_argument('source', help='video file')
+    parser.add_argument('--seeks', type=int, default=50)
+    parser.add_argument('--check', action='store_true', help='compare landed frames against sequential decoding')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    keyframe_index = KeyframeIndex.build(args.source)
+    if keyframe_index is None:
+        raise SystemExit('PyAV is required to build the keyframe index')
+    print(f"keyframe index: {len(keyframe_index)} keyframes in {time.perf_counter() - start:.2f} s")
+
+    plain = FrameSource(args.source)
+    targets = np.random.default_rng(0).integers(0, plain.total_frames - 1, args.seeks)
+
+    indexed = FrameSource(args.source)
+    indexed.set_keyframe_index(keyframe_index)
+
+    for name, frame_source in (('CAP_PROP_POS_FRAMES', plain), ('keyframe index', indexed)):
+        times = time_seeks(frame_source, targets)
+        print(f"{name:>20}: mean {times.mean():.1f} ms, p95 {np.percentile(times, 95):.1f} ms, max {times.max():.1f} ms")
+
+    if args.check:
+        reference = FrameSource(args.source)
+        frames = {}
+        for frame_number in range(int(targets.max()) + 1):
+            _, image = reference.read()
+            if frame_number in targets:
+                frames[frame_number] = image
+
+        for name, frame_source in (('CAP_PROP_POS_FRAMES', plain), ('keyframe index', indexed)):
+            wrong = sum(not np.array_equal(frame_source.read(int(n))[1], frames[int(n)]) for n in targets)
+            print(f"{name:>20}: {wrong} of {len(targets)} seeks landed on the wrong frame")
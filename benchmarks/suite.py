@@ -0,0 +1,332 @@
+import os
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import supervision as sv
+
+import sys
+import json
+import time
+import pathlib
+import argparse
+import itertools
+import platform
+import tempfile
+import cv2
+import numpy as np
+
+from benchmarks.bench_annotations import CLASS_NAMES, synthetic_tracks
+from tools.annotators import COLOR_LIST, AnnotationCache, box_annotations, mask_annotations, pose_annotations, track_annotations
+from tools.frame_source import FrameSource
+from tools.track_history import TrackHistory
+from tools.write_csv import ResultsWriter, csv_detections_list, write_csv
+
+
+POSE_CONFIG = {'HEAD': True, 'ARMS': True, 'TRUNK': True, 'LEGS': True}
+
+
+# --------------
+# Synthetic data
+# --------------
+def synthetic_detections(count: int, width: int, height: int, masks: bool = False, seed: int = 0) -> tuple[sv.Detections, list[str]]:
+    """ Random tracks with labels, and an elliptic mask inside every box when masks is set """
+    tracks, labels = synthetic_tracks(count, width, height, seed)
+    if masks:
+        mask = np.zeros((count, height, width), dtype=bool)
+        for index, (x1, y1, x2, y2) in enumerate(tracks.xyxy.astype(int)):
+            canvas = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+            axes = (max(1, (x2 - x1) // 2), max(1, (y2 - y1) // 2))
+            cv2.ellipse(canvas, axes, axes, 0, 0, 360, 1, -1)
+            mask[index, y1:y2, x1:x2] = canvas.astype(bool)
+        tracks.mask = mask
+
+    return tracks, labels
+
+
+def moving_tracks(count: int, width: int, height: int, frames: int, seed: int = 0) -> list[sv.Detections]:
+    """ Tracks of count objects moving at constant speed for the given frames """
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, [width - 100, height - 100], (count, 2))
+    velocity = rng.uniform(-4, 4, (count, 2))
+    size = rng.uniform(20, 100, (count, 2))
+    class_id = rng.integers(0, len(CLASS_NAMES), count)
+
+    tracks = []
+    for frame_number in range(frames):
+        top_left = np.clip(start + velocity * frame_number, 0, [width - 101, height - 101])
+        tracks.append(sv.Detections(
+            xyxy=np.hstack([top_left, top_left + size]),
+            confidence=np.full(count, 0.9),
+            class_id=class_id,
+            tracker_id=np.arange(1, count + 1)
+        ))
+
+    return tracks
+
+
+def synthetic_poses(count: int, width: int, height: int, seed: int = 0) -> list:
+    """ 17 COCO keypoints per person as integer (x, y) lists """
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(100, [width - 100, height - 100], (count, 1, 2))
+    poses = centres + rng.uniform(-80, 80, (count, 17, 2))
+
+    return poses.astype(int).tolist()
+
+
+def synthetic_video(path: str, width: int, height: int, frames: int, objects: int, fps: float = 30.0, seed: int = 0) -> str:
+    """ Write an mp4v video of objects moving over a noisy background """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for tracks in moving_tracks(objects, width, height, frames, seed):
+        frame = background.copy()
+        for (x1, y1, x2, y2), class_id in zip(tracks.xyxy.astype(int), tracks.class_id):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), COLOR_LIST.by_idx(class_id).as_bgr(), -1)
+        writer.write(frame)
+    writer.release()
+
+    return path
+
+
+# ------
+# Timing
+# ------
+def measure(function: callable, repeat: int, setup: callable = None, min_sample: float = 0.001) -> dict:
+    """ Milliseconds per call of function after one warm-up call
+
+    setup runs before every call, outside the timing, and its result is
+    passed to function. Functions faster than min_sample seconds are timed
+    over several calls per sample, so timer resolution and noise do not
+    dominate sub-millisecond results.
+    """
+    def call():
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(argument) if setup is not None else function()
+        return time.perf_counter() - start
+
+    number = min(1000, max(1, int(min_sample / max(call(), 1e-9))))
+    times = 1000 * np.array([sum(call() for _ in range(number)) / number for _ in range(repeat)])
+
+    return {
+        'repeat': repeat,
+        'number': number,
+        'mean_ms': float(times.mean()),
+        'p50_ms': float(np.percentile(times, 50)),
+        'p95_ms': float(np.percentile(times, 95))
+    }
+
+
+# ----------
+# Benchmarks
+# ----------
+def annotation_benchmarks(config: dict) -> dict:
+    width, height, objects, repeat = config['width'], config['height'], config['objects'], config['repeat']
+    scene = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    tracks, labels = synthetic_detections(objects, width, height, config['masks'])
+    cache = AnnotationCache(sprites=True)
+
+    results = {
+        'box_annotations': measure(lambda frame: box_annotations(frame, tracks, labels, cache), repeat, scene.copy)
+    }
+    if config['masks']:
+        results['mask_annotations'] = measure(lambda frame: mask_annotations(frame, tracks), repeat, scene.copy)
+
+    # Trails of full length, advanced by one frame per call, moving back and forth
+    trail_frames = moving_tracks(objects, width, height, 256)
+    track_history = TrackHistory(maxlen=64)
+    for frame_tracks in trail_frames[:128]:
+        track_history.update(frame_tracks.tracker_id, (frame_tracks.xyxy[:, :2] + frame_tracks.xyxy[:, 2:]).astype(np.int32) // 2)
+    pending = itertools.cycle(trail_frames[128:] + trail_frames[-2:128:-1])
+    results['track_annotations'] = measure(
+        lambda item: track_annotations(item[0], item[1], track_history),
+        repeat,
+        lambda: (scene.copy(), next(pending))
+    )
+
+    poses = synthetic_poses(objects, width, height)
+    results['pose_annotations'] = measure(lambda frame: pose_annotations(frame, poses, POSE_CONFIG), repeat, scene.copy)
+
+    return results
+
+
+def csv_benchmarks(config: dict) -> dict:
+    """ Writing the detections of one frame to a CSV file """
+    detections, _ = synthetic_detections(config['objects'], config['width'], config['height'])
+    class_names = dict(enumerate(CLASS_NAMES))
+
+    with tempfile.TemporaryDirectory() as directory:
+        save_path = str(pathlib.Path(directory) / 'write_csv.csv')
+        results = {
+            'csv_detections_list': measure(lambda: csv_detections_list([], 0, detections, class_names), config['repeat']),
+            'write_csv': measure(lambda: write_csv(save_path, csv_detections_list([], 0, detections, class_names)), config['repeat'])
+        }
+        with ResultsWriter(str(pathlib.Path(directory) / 'results_writer.csv'), class_names, mode='w') as results_writer:
+            results['results_writer'] = measure(lambda: results_writer.write_detections(0, detections), config['repeat'])
+
+    return results
+
+
+def display_benchmarks(config: dict) -> dict:
+    """ convert_cv_qt and UI_VideoView display paths, skipped without PySide6 """
+    try:
+        from PySide6.QtWidgets import QApplication
+        from PySide6.QtGui import QImage
+        from benchmarks.bench_display import convert_cv_qt, new_path, old_path
+        from components.ui_video_view import UI_VideoView
+    except ImportError as error:
+        return {name: {'skipped': str(error)} for name in ('convert_cv_qt', 'display_convert_cv_qt', 'display_video_view')}
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    frame = np.random.default_rng(0).integers(0, 255, (config['height'], config['width'], 3), dtype=np.uint8)
+    view_width, view_height = config['view']
+    view = UI_VideoView(None, size=(view_width, view_height))
+    canvas = QImage(view_width, view_height, QImage.Format.Format_RGB32)
+
+    return {
+        'convert_cv_qt': measure(lambda: convert_cv_qt(frame), config['repeat']),
+        'display_convert_cv_qt': measure(lambda: old_path(frame, canvas), config['repeat']),
+        'display_video_view': measure(lambda: new_path(view, frame, canvas), config['repeat'])
+    }
+
+
+def decode_benchmarks(config: dict, video_path: str) -> dict:
+    """ Frame reads in order with and without a seek before every frame """
+    frames = config['frames']
+
+    def sequential():
+        frame_source = FrameSource(video_path)
+        for frame_number in range(frames):
+            frame_source.read(frame_number)
+        frame_source.release()
+
+    def seek_every_frame():
+        cap = cv2.VideoCapture(video_path)
+        for frame_number in range(frames):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            cap.read()
+        cap.release()
+
+    repeat = max(1, config['repeat'] // 10)
+    results = {}
+    for name, function in (('decode_sequential', sequential), ('decode_seek_per_frame', seek_every_frame)):
+        result = measure(function, repeat)
+        for key in ('mean_ms', 'p50_ms', 'p95_ms'):
+            result[key] /= frames
+        results[name] = result
+
+    return results
+
+
+def run_suite(config: dict) -> dict:
+    """ Time every benchmark with the synthetic data of config
+
+    Parameters
+    ----------
+        config (dict): Suite settings
+            Keys: 'width', 'height', 'objects', 'masks', 'frames', 'repeat', 'view', 'threads'
+
+    Returns
+    -------
+        dict: Report with the config, the environment and ms per call of every benchmark
+    """
+    if config['threads'] is not None:
+        cv2.setNumThreads(config['threads'])
+
+    results = {}
+    results.update(annotation_benchmarks(config))
+    results.update(csv_benchmarks(config))
+    results.update(display_benchmarks(config))
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = synthetic_video(str(pathlib.Path(directory) / 'synthetic.mp4'), config['width'], config['height'], config['frames'], config['objects'])
+        results.update(decode_benchmarks(config, video_path))
+
+    return {
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'supervision': sv.__version__
+        },
+        'results': results
+    }
+
+
+# --------
+# Baseline
+# --------
+def compare(report: dict, baseline: dict, tolerance: float) -> list[tuple]:
+    """ Benchmarks of both reports, with their p50 ratio and whether it regressed
+
+    Returns
+    -------
+        list[tuple]: (name, baseline p50 ms, p50 ms, ratio, regressed)
+    """
+    rows = []
+    for name, result in report['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None or 'p50_ms' not in result or 'p50_ms' not in reference:
+            continue
+        ratio = result['p50_ms'] / reference['p50_ms'] if reference['p50_ms'] > 0 else 1.0
+        rows.append((name, reference['p50_ms'], result['p50_ms'], ratio, ratio > 1 + tolerance))
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CPU benchmarks of the pipeline hot functions on synthetic data')
+    parser.add_argument('--size', type=int, nargs=2, default=[1920, 1080], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--objects', type=int, default=50, help='objects per frame')
+    parser.add_argument('--masks', action=argparse.BooleanOptionalAction, default=True, help='give the objects masks')
+    parser.add_argument('--frames', type=int, default=120, help='frames of the synthetic video')
+    parser.add_argument('--repeat', type=int, default=100, help='timed calls per benchmark')
+    parser.add_argument('--view', type=int, nargs=2, default=[1080, 612], metavar=('WIDTH', 'HEIGHT'), help='display size')
+    parser.add_argument('--threads', type=int, default=1, help='OpenCV threads, 0 for the OpenCV default')
+    parser.add_argument('--out', default='benchmarks/report.json', help='JSON report')
+    parser.add_argument('--baseline', default='benchmarks/baseline.json', help='report to compare against, if it exists')
+    parser.add_argument('--save-baseline', action='store_true', help='also save the report as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='p50 slowdown over the baseline reported as a regression')
+    args = parser.parse_args()
+
+    config = {
+        'width': args.size[0],
+        'height': args.size[1],
+        'objects': args.objects,
+        'masks': args.masks,
+        'frames': args.frames,
+        'repeat': args.repeat,
+        'view': args.view,
+        'threads': args.threads if args.threads > 0 else None
+    }
+    report = run_suite(config)
+
+    pathlib.Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, 'w') as file:
+        json.dump(report, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    print(f"{'benchmark':>22} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, result in report['results'].items():
+        if 'skipped' in result:
+            print(f"{name:>22}   skipped: {result['skipped']}")
+        else:
+            print(f"{name:>22} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f}")
+
+    baseline_path = pathlib.Path(args.baseline)
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        if baseline['config'] != report['config']:
+            print(f"Baseline config differs: {baseline['config']}")
+        rows = compare(report, baseline, args.tolerance)
+        print(f"\n{'benchmark':>22} {'baseline':>9} {'current':>9} {'ratio':>6}")
+        for name, reference_ms, current_ms, ratio, regressed in rows:
+            print(f"{name:>22} {reference_ms:>9.3f} {current_ms:>9.3f} {ratio:>6.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
@@ -0,0 +1,100 @@
+""" Headless detection and tracking, without PySide6
+
+Usage:
+    python cli.py track in.mp4 --weights weights/yolov8m.pt --out tracks.csv
+    python cli.py batch videos/ --weights weights/yolov8m.pt --out-dir results --workers 4
+    python cli.py chunked long.mp4 --weights weights/yolov8m.pt --out tracks.csv --workers 8
+"""
+import sys
+import pathlib
+import argparse
+
+from tools.batch_inference import process_video
+from tools.batch_runner import BatchRunner, expand_sources, load_settings_model, make_pipeline
+from tools.cpu_profile import EXPORT_FORMATS
+from tools.chunked_runner import ChunkedRunner
+
+
+def add_model_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--weights', default='weights/yolov8m.pt', help='YOLOv8 weights file')
+    parser.add_argument('--imgsz', type=int, default=640, help='inference image size')
+    parser.add_argument('--conf', type=float, default=0.5, help='confidence threshold')
+    parser.add_argument('--device', default=None, help="inference device: '0', '1', ... or 'cpu'. Default: GPU 0 if available, else cpu")
+    parser.add_argument('--classes', type=int, nargs='*', default=None, help='class ids to detect')
+    parser.add_argument('--batch-size', type=int, default=8, help='frames per inference call')
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads of PyTorch and OpenCV')
+    parser.add_argument('--half-resolution', action='store_true', help='infer at half the image size')
+    parser.add_argument('--export', choices=EXPORT_FORMATS, default=None, help='run the weights exported to this format')
+
+
+def model_settings(args: argparse.Namespace) -> dict:
+    return {
+        'weights': args.weights,
+        'imgsz': args.imgsz,
+        'conf': args.conf,
+        'device': args.device,
+        'classes': args.classes,
+        'batch_size': args.batch_size,
+        'threads': args.threads,
+        'half_resolution': args.half_resolution,
+        'export': args.export
+    }
+
+
+def track_command(args: argparse.Namespace) -> None:
+    if pathlib.Path(args.out).exists():
+        pathlib.Path(args.out).unlink()
+
+    settings = model_settings(args)
+    pipeline = make_pipeline(load_settings_model(settings), settings)
+    stats = process_video(args.source, pipeline, args.batch_size, args.out, args.max_frames, args.video)
+    print(f"{args.source}: {stats['frames']} frames in {stats['seconds']:.2f} s, {stats['fps']:.2f} frames/s, inference {pipeline.stats()['inference_ms']:.1f} ms/frame")
+
+
+def batch_command(args: argparse.Namespace) -> None:
+    sources = expand_sources(args.sources)
+    runner = BatchRunner(sources, args.out_dir, model_settings(args), args.workers)
+    stats = runner.run()
+    print(f"{stats['files']} files, {stats['failed']} failed, {stats['frames']} frames in {stats['seconds']:.2f} s | {runner.report(stats['seconds'])}")
+
+
+def chunked_command(args: argparse.Namespace) -> None:
+    runner = ChunkedRunner(args.source, args.out, model_settings(args), args.workers, args.chunks, args.overlap)
+    stats = runner.run()
+    print(f"{args.source}: {stats['chunks']} chunks, {stats['stitched_tracks']} tracks stitched, {stats['frames']} frames in {stats['seconds']:.2f} s, {stats['fps']:.2f} frames/s")
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Video object detection and tracking')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    track_parser = subparsers.add_parser('track', help='detect and track objects in a video')
+    track_parser.add_argument('source', help='video file')
+    track_parser.add_argument('--out', required=True, help='tracks file: .csv, or .parquet and .npz for columnar files')
+    track_parser.add_argument('--video', default=None, help='annotated output video')
+    track_parser.add_argument('--max-frames', type=int, default=None, help='process only the first frames')
+    add_model_arguments(track_parser)
+    track_parser.set_defaults(function=track_command)
+
+    batch_parser = subparsers.add_parser('batch', help='track every video of a directory or glob pattern')
+    batch_parser.add_argument('sources', help="directory or glob pattern, e.g. 'clips/**/*.mp4'")
+    batch_parser.add_argument('--out-dir', required=True, help='directory for track files and the checkpoint')
+    batch_parser.add_argument('--workers', type=int, default=2, help='worker processes')
+    add_model_arguments(batch_parser)
+    batch_parser.set_defaults(function=batch_command)
+
+    chunked_parser = subparsers.add_parser('chunked', help='track a long video split into chunks tracked in parallel')
+    chunked_parser.add_argument('source', help='video file')
+    chunked_parser.add_argument('--out', required=True, help='CSV file for tracks')
+    chunked_parser.add_argument('--workers', type=int, default=4, help='worker processes')
+    chunked_parser.add_argument('--chunks', type=int, default=None, help='number of chunks, one per worker by default')
+    chunked_parser.add_argument('--overlap', type=int, default=30, help='frames tracked by both neighbouring chunks')
+    add_model_arguments(chunked_parser)
+    chunked_parser.set_defaults(function=chunked_command)
+
+    args = parser.parse_args(argv)
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,9 +1,10 @@
 from PySide6.QtWidgets import QWidget
-from PySide6.QtCharts import QChartView, QChart, QValueAxis
+from PySide6.QtCharts import QChartView, QChart, QValueAxis, QBarCategoryAxis, QBarSet, QHorizontalBarSeries
 from PySide6.QtCore import Qt, QMargins
+from PySide6.QtGui import QColor
 
 import qtawesome as qta
-from themes.colors import light_colors, dark_colors
+from themes.colors import light_colors, dark_colors, theme_colors
 
 from icecream import ic
 
@@ -50,3 +51,45 @@ class UI_Chart(QChartView):
         if self.texts is not None:
             if language == 'es': self.chart_plot.setTitle(self.texts[0])
             elif language == 'en': self.chart_plot.setTitle(self.texts[1])
+
+    def set_bars(self, categories: list[str], bar_sets: dict[str, list[float]]) -> None:
+        """ Replace the chart content with horizontal bars
+
+        Parameters
+        ----------
+            categories (list[str]): Category labels, bottom to top
+            bar_sets (dict[str, list[float]]): Values of every category per bar set name
+        """
+        self.chart_plot.removeAllSeries()
+        for axis in self.chart_plot.axes():
+            self.chart_plot.removeAxis(axis)
+
+        h, s, l = light_colors['@text_active'] if self.theme_style else dark_colors['@text_active']
+        text_color = QColor.fromHslF(h/360, s/100, l/100)
+        h, s, l = theme_colors[self.theme_color]['@theme_active']
+
+        series = QHorizontalBarSeries()
+        for index, (name, values) in enumerate(bar_sets.items()):
+            bar_set = QBarSet(name)
+            bar_set.append([float(value) for value in values])
+            bar_set.setColor(QColor.fromHslF(h/360, s/100, min(0.9, l/100 + 0.25 * index)))
+            bar_set.setBorderColor(Qt.GlobalColor.transparent)
+            series.append(bar_set)
+        self.chart_plot.addSeries(series)
+
+        axis_y = QBarCategoryAxis()
+        axis_y.append(categories)
+        axis_y.setLabelsColor(text_color)
+        axis_y.setGridLineVisible(False)
+        self.chart_plot.addAxis(axis_y, Qt.AlignmentFlag.AlignLeft)
+        series.attachAxis(axis_y)
+
+        axis_x = QValueAxis()
+        axis_x.setRange(0, max([max(values, default=0.0) for values in bar_sets.values()] + [1.0]))
+        axis_x.setLabelFormat('%.0f')
+        axis_x.setLabelsColor(text_color)
+        self.chart_plot.addAxis(axis_x, Qt.AlignmentFlag.AlignBottom)
+        series.attachAxis(axis_x)
+
+        self.chart_plot.legend().setVisible(len(bar_sets) > 1)
+        self.chart_plot.legend().setLabelColor(text_color)
@@ -0,0 +1,140 @@
+from PySide6.QtWidgets import QWidget
+from PySide6.QtGui import QImage, QMouseEvent, QPainter, QPaintEvent, QPen, QPolygonF
+from PySide6.QtCore import QPointF, Qt
+
+import cv2
+import numpy as np
+
+
+class UI_VideoView(QWidget):
+    """ Video frame view component
+
+    Frames are scaled to the widget size with OpenCV into a buffer reused
+    between frames, and the buffer is wrapped by a BGR888 QImage without
+    colour conversion or copies before painting.
+
+    Regions of interest are drawn over the frame: left click adds a vertex,
+    double click closes the polygon and right click clears all polygons.
+    Polygons are kept in frame pixels.
+    """
+    def __init__(
+        self,
+        parent: QWidget,
+        position: tuple[int, int] = (8, 8),
+        size: tuple[int, int] = (320, 240),
+        polygons_changed_signal: callable = None
+    ):
+        """
+        Parameters
+        ----------
+            parent (QWidget): UI Parent object
+            position (tuple[int, int]): View top left corner position (x, y)
+            size (tuple[int, int]): View size (width, height)
+            polygons_changed_signal (callable): 'polygons changed' method name,
+                called with the list of closed polygons in frame pixels
+        """
+        super().__init__(parent)
+
+        self.parent = parent
+        self.move(position[0], position[1])
+        self.resize(size[0], size[1])
+
+        self.buffer = None
+        self.image = None
+        self.frame_size = None
+
+        self.polygons = []
+        self.points = []
+        self.polygons_changed_signal = polygons_changed_signal
+
+    def fit_size(self, width: int, height: int) -> tuple[int, int]:
+        """ Largest size with the frame aspect ratio that fits in the view """
+        scale = min(self.width() / width, self.height() / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def prepare(self, frame: np.ndarray) -> QImage:
+        """ Scale a BGR frame into the view buffer and wrap it as a QImage """
+        height, width = frame.shape[:2]
+        self.frame_size = (width, height)
+        target_width, target_height = self.fit_size(width, height)
+
+        if self.buffer is None or self.buffer.shape[:2] != (target_height, target_width):
+            self.buffer = np.empty((target_height, target_width, 3), dtype=np.uint8)
+
+        if (target_width, target_height) == (width, height):
+            np.copyto(self.buffer, frame)
+        else:
+            cv2.resize(frame, (target_width, target_height), dst=self.buffer, interpolation=cv2.INTER_LINEAR)
+
+        return QImage(self.buffer.data, target_width, target_height, self.buffer.strides[0], QImage.Format.Format_BGR888)
+
+    def set_frame(self, frame: np.ndarray) -> None:
+        """ Show a BGR frame """
+        self.image = self.prepare(frame)
+        self.update()
+
+    # -------
+    # Regions
+    # -------
+    def image_origin(self) -> tuple[int, int]:
+        """ Top left corner of the frame in the view """
+        return (self.width() - self.image.width()) // 2, (self.height() - self.image.height()) // 2
+
+    def to_frame(self, x: float, y: float) -> tuple[int, int]:
+        """ View point in frame pixels """
+        origin_x, origin_y = self.image_origin()
+        scale = self.frame_size[0] / self.image.width()
+        frame_x = min(max(0, (x - origin_x) * scale), self.frame_size[0] - 1)
+        frame_y = min(max(0, (y - origin_y) * scale), self.frame_size[1] - 1)
+        return int(frame_x), int(frame_y)
+
+    def to_view(self, points: list[tuple[int, int]]) -> QPolygonF:
+        """ Frame points in view coordinates """
+        origin_x, origin_y = self.image_origin()
+        scale = self.image.width() / self.frame_size[0]
+        return QPolygonF([QPointF(origin_x + x * scale, origin_y + y * scale) for x, y in points])
+
+    def clear_polygons(self) -> None:
+        self.polygons = []
+        self.points = []
+        self.update()
+        if self.polygons_changed_signal is not None:
+            self.polygons_changed_signal(self.polygons)
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if self.image is None:
+            return
+        if event.button() == Qt.MouseButton.RightButton:
+            self.clear_polygons()
+        elif event.button() == Qt.MouseButton.LeftButton:
+            self.points.append(self.to_frame(event.position().x(), event.position().y()))
+            self.update()
+
+    def mouseDoubleClickEvent(self, event: QMouseEvent) -> None:
+        if self.image is None or event.button() != Qt.MouseButton.LeftButton:
+            return
+        # The first click of the double click added the last vertex
+        points = list(dict.fromkeys(self.points))
+        self.points = []
+        if len(points) >= 3:
+            self.polygons.append(np.array(points, dtype=np.int32))
+            if self.polygons_changed_signal is not None:
+                self.polygons_changed_signal(self.polygons)
+        self.update()
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        if self.image is None:
+            return
+        painter = QPainter(self)
+        x, y = self.image_origin()
+        painter.drawImage(x, y, self.image)
+
+        if self.polygons or self.points:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setPen(QPen(Qt.GlobalColor.yellow, 2))
+            for polygon in self.polygons:
+                painter.drawPolygon(self.to_view(polygon.tolist()))
+            if self.points:
+                painter.setPen(QPen(Qt.GlobalColor.yellow, 2, Qt.PenStyle.DashLine))
+                painter.drawPolyline(self.to_view(self.points))
+        painter.end()
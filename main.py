@@ -1,7 +1,6 @@
 from PySide6 import QtGui, QtWidgets
 from PySide6.QtWidgets import QApplication, QMainWindow
 from PySide6.QtCore import QTimer
-from PySide6.QtGui import QPixmap
 
 from components.ui_button import UI_Button, UI_ThemeButton, UI_ToggleButton, UI_DropDownButton
 from components.ui_checkbox import UI_CheckBox
@@ -12,24 +11,33 @@ from components.ui_label import UI_IconLabel
 from components.ui_datetimepicker import UI_CalendarView
 from components.ui_combobox import UI_ComboBox
 
-from ultralytics import YOLO
 import supervision as sv
 
 from themes.colors import dark_colors, light_colors, theme_colors, icons
 
 import sys
+import time
 import pathlib
 import yaml
 from typing import Union
-from collections import deque
-
-import cv2
 
 from main_ui import Main_UI
 from dialogs.about_app import AboutApp
-
-from tools.annotators import box_annotations, mask_annotations, track_annotations
-from tools.write_csv import csv_detections_list, write_csv
+from dialogs.info_message import InfoMessageApp
+
+from tools.write_csv import ResultsWriter
+from tools.frame_source import FrameSource
+from tools.pipeline import FramePipeline
+from tools.detection_cache import DetectionCache, file_hash
+from tools.keyframe_index import build_keyframe_index_async
+from tools.video_worker import VideoWorker
+from tools.replay import ReplayPipeline, TrackIndex
+from tools.model_registry import ModelRegistry, device_key
+from tools.cpu_profile import default_device, inference_size, set_cpu_threads
+from tools.frame_scheduler import FrameSkipScheduler
+from tools.motion_gate import MotionGate
+from tools.stage_profiler import StageProfiler
+from tools.region_inference import REGION_MODES, RegionDetector
 
 # For debugging
 from icecream import ic
@@ -51,13 +59,34 @@ class MainWindow(QMainWindow):
         self.theme_style = self.config['THEME_STYLE']
         self.theme_color = self.config['THEME_COLOR']
 
+        # CPU profile
+        self.cpu_threads = self.config.get('CPU_THREADS')
+        self.half_resolution = self.config.get('HALF_RESOLUTION', False)
+        self.export_format = self.config.get('EXPORT_FORMAT')
+        set_cpu_threads(self.cpu_threads)
+
+        # Reuse detections on frames without motion, enabled in settings.yaml
+        self.motion_gate = self.config.get('MOTION_GATE', False)
+
+        # Write the tracks of every session to its own file in results/
+        self.record_tracks = self.config.get('RECORD_TRACKS', False)
+
         # ---------
         # Variables
         # ---------
         self.weights_options = ['yolov8m.pt', 'yolov8l.pt', 'yolov8x.pt']
         self.device_options = ['0', 'cpu']
+        self.model_weights = self.weights_options[0]
+        self.model_device = default_device()
+        self.model_size = 640
+        self.model_confidence = 0.5
+
+        # Detection on the whole frame, on drawn regions of interest or on tiles
+        self.region_mode = 'full'
+        self.region_polygons = []
+        self.region_detector = None
 
-        self.cap = None
+        self.frame_source = None
         self.video_width = None
         self.video_height = None
         self.video_total_frames = None
@@ -69,6 +98,7 @@ class MainWindow(QMainWindow):
 
         self.time_step = 0
         self.frame_number = 0
+        self.error_message = None
 
         self.class_options = {
             'person': [False, 0],
@@ -79,12 +109,21 @@ class MainWindow(QMainWindow):
             'truck': [False, 7]
         }
 
-        # object tracks
-        self.track_deque = {}
+        # Detection, tracking and annotation pipeline
+        self.pipeline = None
+        self.video_worker = None
+        self.detection_cache = DetectionCache()
+        self.results_writer = None
 
-        # Detector and Tracker
-        self.yolov8_model = None
-        self.byte_tracker = None
+        # Stage timings, shown as an overlay and a chart and saved per source
+        self.profiler = StageProfiler()
+        self.profiler_overlay = False
+        self.profile_path = None
+        self.profiled_frames = 0
+
+        # Models loaded in the background and kept across sources
+        self.model_registry = ModelRegistry()
+        self.model_future()
 
         # ----------------
         # Generación de UI
@@ -114,6 +153,8 @@ class MainWindow(QMainWindow):
         elif self.language_value == 'en':
             self.ui.gui_widgets['language_combobox'].setCurrentIndex(1)
 
+        self.ui.gui_widgets['device_menu'].setCurrentIndex(self.device_options.index(self.model_device))
+
     # ---------
     # Functions
     # ---------
@@ -207,23 +248,39 @@ class MainWindow(QMainWindow):
         self.ui.gui_widgets['video_slider'].resize(self.ui.gui_widgets['video_toolbar_card'].width() - 236, 40)
         # self.ui.gui_widgets['frame_value_textfield'].move(self.ui.gui_widgets['video_toolbar_card'].width() - 108, 8)
 
-        # self.ui.gui_widgets['video_output_card'].resize(width - 204, height - 92)
-
-        # frame_width = (self.ui.gui_widgets['video_output_card'].height() - 56) * self.aspect_ratio
-        # frame_height = self.ui.gui_widgets['video_output_card'].height() - 56
-        # if frame_width > self.ui.gui_widgets['video_output_card'].width() - 16:
-        #     frame_width = self.ui.gui_widgets['video_output_card'].width() - 16
-        #     frame_height = frame_width / self.aspect_ratio
-        # self.ui.gui_widgets['video_label'].resize(frame_width, frame_height)
+        self.ui.gui_widgets['video_output_card'].resize(width - 220, height - 88)
+        self.ui.gui_widgets['video_label'].resize(width - 236, height - 104)
+        self.ui.gui_widgets['profiler_chart'].move(width - 596, height - 304)
 
         return super().resizeEvent(a0)
     
 
     def closeEvent(self, a0: QtGui.QCloseEvent) -> None:
-        if self.timer_play is not None and self.timer_reverse is not None and self.cap is not None:
+        if self.timer_play is not None and self.timer_reverse is not None and self.frame_source is not None:
             self.timer_play.stop() if self.timer_play.isActive() else self.timer_reverse.stop()
-            if self.cap.isOpened():
-                self.cap.release()
+            if self.video_worker is not None:
+                self.video_worker.stop()
+                print(f"Video worker: {self.video_worker.stats()}")
+                print(f"Pipeline: {self.pipeline.stats()}")
+                if self.pipeline.scheduler is not None:
+                    print(f"Frame scheduler: {self.pipeline.scheduler.stats()}")
+                if self.pipeline.motion_gate is not None:
+                    print(f"Motion gate: {self.pipeline.motion_gate.stats()}")
+                if self.region_detector is not None:
+                    print(f"Region detector: {self.region_detector.stats()}")
+                print(f"Track history: {self.pipeline.track_history.stats()}")
+                print(f"Detection cache: {self.detection_cache.stats()}")
+            if self.results_writer is not None:
+                self.results_writer.close()
+                print(f"Results writer: {self.results_writer.stats()}")
+            print(f"Stage profiler: {self.profiler.stats()}")
+            self.export_profile()
+            if self.frame_source.isOpened():
+                print(f"Frame source: {self.frame_source.stats()}")
+                self.frame_source.release()
+        self.detection_cache.close()
+        print(f"Model registry: {self.model_registry.stats()}")
+        self.model_registry.shutdown()
 
         return super().closeEvent(a0)
 
@@ -239,71 +296,225 @@ class MainWindow(QMainWindow):
             'Archivos de Video (*.mp4 *.avi *.mov)'
         )[0]
         
-        if source_file is not None:
-            # Save folder in settings
-            self.config['FOLDER'] = str(pathlib.Path(source_file).parent)
-            with open(self.settings_file, 'w') as file:
-                yaml.dump(self.config, file)
-
-            # YOLOv8 Initialization
-            self.yolov8_model = YOLO('weights/yolov8m.pt')
-
-            # Initialize Byte Tracker
-            self.byte_tracker = sv.ByteTrack()
-
-            # Open video
-            self.cap = cv2.VideoCapture(source_file)
-            if self.cap.isOpened():
-                _, image = self.cap.read()
-
-                # Video properties
-                self.video_width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-                self.video_height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-                self.video_total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                self.video_fps = float(self.cap.get(cv2.CAP_PROP_FPS))
-                
-                self.aspect_ratio = float(self.video_width / self.video_height)
-                self.time_step = int(1000 / self.video_fps)
-
-                # Timers
-                self.timer_play = QTimer()
-                self.timer_play.timeout.connect(self.play_forward)
-                self.timer_reverse = QTimer()
-                self.timer_reverse.timeout.connect(self.play_backward)
-
-                # Write results in GUI
-                self.ui.gui_widgets['source_icon'].set_icon_label('file_video', self.theme_color)
-                self.ui.gui_widgets['filename_value'].setText(f"{pathlib.Path(source_file).name}")
-                self.ui.gui_widgets['size_value'].setText(f"{int(self.video_width)} X {int(self.video_height)}")
-                self.ui.gui_widgets['total_frames_value'].setText(f"{self.video_total_frames}")
-                self.ui.gui_widgets['fps_value'].setText(f"{self.video_fps:.2f}")
-
-                self.ui.gui_widgets['video_slider'].setEnabled(True)
-                self.ui.gui_widgets['video_slider'].setMaximum(self.video_total_frames)
-
-                # Showing first frame
-                self.ui.gui_widgets['video_label'].setPixmap(self.convert_cv_qt(image))
-                self.ui.gui_widgets['frame_value_textfield'].text_field.setText(f"{self.frame_number}")
-                
-                # Frame aspect ratio
-                self.ui.gui_widgets['video_label'].resize((self.ui.gui_widgets['video_output_card'].height() - 56) * self.aspect_ratio, self.ui.gui_widgets['video_output_card'].height() - 56)
-            else:
-                print('Error opening video stream or file')
+        if not source_file:
+            return
+
+        frame_source = FrameSource(source_file)
+        if not frame_source.isOpened():
+            frame_source.release()
+            print('Error opening video stream or file')
+            return
+
+        # Tracks file of this session, opened before closing the previous source
+        results_writer = self.open_tracks_writer(source_file) if self.record_tracks else None
+
+        # Save folder in settings
+        self.config['FOLDER'] = str(pathlib.Path(source_file).parent)
+        with open(self.settings_file, 'w') as file:
+            yaml.dump(self.config, file)
+
+        # Close the previous source
+        if self.video_worker is not None:
+            self.video_worker.stop()
+            self.video_worker = None
+        if self.frame_source is not None:
+            self.frame_source.release()
+        if self.results_writer is not None:
+            self.results_writer.close()
+        self.export_profile()
+        self.profile_path = f"results/{pathlib.Path(source_file).stem}_profile.json"
+        self.frame_source = frame_source
+
+        # YOLOv8 Initialization and Byte Tracker
+        self.pipeline = FramePipeline(self.model_future(), sv.ByteTrack(), weights=self.model_weights)
+        self.pipeline.use_cache(self.detection_cache, file_hash(source_file))
+        self.pipeline.use_profiler(self.profiler)
+
+        self.frame_number = 0
+        _, image = self.frame_source.read(self.frame_number)
+
+        # Video properties
+        self.video_width = self.frame_source.width
+        self.video_height = self.frame_source.height
+        self.video_total_frames = self.frame_source.total_frames
+        self.video_fps = self.frame_source.fps
+        
+        self.aspect_ratio = float(self.video_width / self.video_height)
+        self.time_step = int(1000 / self.video_fps)
+
+        # Detect only on as many playback frames as inference keeps up with.
+        # Recorded sessions detect every frame, so no played frame is left out
+        if not self.record_tracks:
+            self.pipeline.use_scheduler(FrameSkipScheduler(self.video_fps))
+        if self.motion_gate:
+            self.pipeline.use_motion_gate(MotionGate())
+
+        # Frames are written in increasing order, frames jumped over are not
+        self.results_writer = results_writer
+        if self.results_writer is not None:
+            self.pipeline.use_results_writer(self.results_writer)
+            print(f"Recording tracks in {self.results_writer.save_path}")
+
+        # Background worker
+        self.start_video_worker()
+
+        # Timers
+        self.timer_play = QTimer()
+        self.timer_play.timeout.connect(self.play_forward)
+        self.timer_reverse = QTimer()
+        self.timer_reverse.timeout.connect(self.play_backward)
+
+        # Regions drawn on the previous source
+        self.ui.gui_widgets['video_label'].clear_polygons()
+
+        # Write results in GUI
+        self.ui.gui_widgets['source_icon'].set_icon_label('file_video', self.theme_color)
+        self.ui.gui_widgets['filename_value'].setText(f"{pathlib.Path(source_file).name}")
+        self.ui.gui_widgets['size_value'].setText(f"{int(self.video_width)} X {int(self.video_height)}")
+        self.ui.gui_widgets['total_frames_value'].setText(f"{self.video_total_frames}")
+        self.ui.gui_widgets['fps_value'].setText(f"{self.video_fps:.2f}")
+
+        self.ui.gui_widgets['video_slider'].setEnabled(True)
+        self.ui.gui_widgets['video_slider'].setMaximum(self.video_total_frames)
+
+        # Showing first frame
+        self.ui.gui_widgets['video_label'].set_frame(image)
+        self.ui.gui_widgets['frame_value_textfield'].text_field.setText(f"{self.frame_number}")
+
+    def open_tracks_writer(self, source_file: str) -> ResultsWriter:
+        """ Writer of a new tracks file of the source, never an existing file
+
+        Files are named after the source and the time, with a counter when
+        the source is opened again within the same second
+        """
+        pathlib.Path('results').mkdir(exist_ok=True)
+        name = f"results/{pathlib.Path(source_file).stem}_{time.strftime('%Y%m%d_%H%M%S')}"
+        tracks_path = f"{name}.csv"
+        counter = 1
+        while True:
+            try:
+                return ResultsWriter(tracks_path, {}, mode='x')
+            except FileExistsError:
+                counter += 1
+                tracks_path = f"{name}_{counter}.csv"
+
+    def on_replay_button_clicked(self) -> None:
+        """ Draw the tracks of a saved tracks file instead of running the model """
+        if self.frame_source is None or not self.frame_source.isOpened():
+            return
+
+        tracks_file = QtWidgets.QFileDialog.getOpenFileName(
+            None,
+            'Seleccione el archivo de trayectorias',
+            'results',
+            'Archivos de Trayectorias (*.csv *.parquet *.npz)'
+        )[0]
+
+        if tracks_file:
+            class_names = {value[1]: name for name, value in self.class_options.items()}
+            self.pipeline = ReplayPipeline(TrackIndex.load(tracks_file, class_names))
+            self.pipeline.use_profiler(self.profiler)
+
+            if self.timer_play.isActive(): self.timer_play.stop()
+            if self.timer_reverse.isActive(): self.timer_reverse.stop()
+            self.video_worker.stop()
+            if self.results_writer is not None:
+                self.results_writer.close()
+            self.start_video_worker()
+            self.draw_frame()
+
+
+    def start_video_worker(self) -> None:
+        """ Process frames of the current source with the current pipeline in a background worker """
+        self.video_worker = VideoWorker(self.frame_source, self.pipeline)
+        self.video_worker.frame_ready.connect(self.on_frame_ready)
+        self.video_worker.frame_failed.connect(self.on_frame_failed)
+        self.video_worker.start()
+        build_keyframe_index_async(self.frame_source.source, self.video_worker.set_keyframe_index)
+
+    # --------
+    # Profiler
+    # --------
+    def on_profiler_button_clicked(self, state: bool) -> None:
+        """ Show or hide the stage timings overlay and chart """
+        self.profiler_overlay = state
+        self.ui.gui_widgets['profiler_button'].state = state
+        self.ui.gui_widgets['profiler_button'].set_icon(self.theme_style)
+        self.ui.gui_widgets['profiler_chart'].setVisible(state)
+
+    def update_profiler_chart(self) -> None:
+        summary = self.profiler.summary()
+        stages = list(reversed(summary.keys()))
+        self.ui.gui_widgets['profiler_chart'].set_bars(stages, {
+            'p50': [summary[stage]['p50_ms'] for stage in stages],
+            'p95': [summary[stage]['p95_ms'] for stage in stages]
+        })
+
+    def export_profile(self) -> None:
+        """ Save the stage timings of the current source as JSON and start over """
+        if self.profile_path is not None and self.profiled_frames > 0:
+            self.profiler.export(self.profile_path)
+            print(f"Stage profile saved in {self.profile_path}")
+        self.profiler.clear()
+        self.profiled_frames = 0
 
     # -----
     # Model
     # -----
+    def model_future(self):
+        """ Future of the model of the selected weights, device and CPU profile """
+        return self.model_registry.get(
+            f"weights/{self.model_weights}",
+            self.model_device,
+            self.export_format,
+            inference_size(self.model_size, self.half_resolution)
+        )
+
+    def update_model(self) -> None:
+        """ Load the selected model and use it for the next frames """
+        model = self.model_future()
+        if self.pipeline is not None and not isinstance(self.pipeline, ReplayPipeline):
+            self.pipeline.set_model(model, self.model_weights)
+
     def model_activated(self, index: int) -> None:
         self.model_weights = self.weights_options[index]
+        self.update_model()
 
     def size_valueChanged(self) -> None:
         self.model_size = self.ui.gui_widgets['size_numberbox'].value()
+        if self.export_format is not None:
+            # Exported models have a fixed image size
+            self.update_model()
+        if self.region_mode == 'tiles':
+            # Tiles are inferred at full resolution
+            self.update_region()
 
     def confidence_valueChanged(self) -> None:
         self.model_confidence = self.ui.gui_widgets['confidence_floatbox'].value()
         
     def device_activated(self, index: int) -> None:
         self.model_device = self.device_options[index]
+        self.update_model()
+
+    def region_activated(self, index: int) -> None:
+        self.region_mode = REGION_MODES[index]
+        self.update_region()
+
+    def on_polygons_changed(self, polygons: list) -> None:
+        self.region_polygons = list(polygons)
+        if self.region_mode == 'roi':
+            self.update_region()
+
+    def update_region(self) -> None:
+        """ Region detector of the selected mode, None for the whole frame or without polygons """
+        if self.region_mode == 'tiles':
+            self.region_detector = RegionDetector('tiles', tile_size=inference_size(self.model_size, self.half_resolution))
+        elif self.region_mode == 'roi' and self.region_polygons:
+            self.region_detector = RegionDetector('roi', self.region_polygons)
+        else:
+            self.region_detector = None
+        if self.video_worker is not None:
+            self.draw_frame()
 
     def model_start_button_clicked(self) -> None:
         print('start')
@@ -363,11 +574,14 @@ class MainWindow(QMainWindow):
 
     def pause_button_clicked(self) -> None:
         self.timer_play.stop() if self.timer_play.isActive() else self.timer_reverse.stop()
+        self.video_worker.stop_playback()
 
 
     def play_button_clicked(self) -> None:
         if self.timer_reverse.isActive(): self.timer_reverse.stop()
         self.timer_play.start(self.time_step)
+        self.frame_number += 1
+        self.draw_frame()
 
 
     def frontFrame_button_clicked(self) -> None:
@@ -394,76 +608,76 @@ class MainWindow(QMainWindow):
     # ---------
     # Functions
     # ---------
-    def convert_cv_qt(self, cv_img):
-        """Convert from an opencv image to QPixmap"""
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        convert_to_qt_format = QtGui.QImage(rgb_image.data, w, h, bytes_per_line, QtGui.QImage.Format.Format_RGB888)
-        return QPixmap.fromImage(convert_to_qt_format)
-
-
     def draw_frame(self):
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.frame_number)
-        _, image = self.cap.read()
-        annotated_image = image.copy()
-        
-        class_filter = [ value[1] for value in self.class_options.values() if value[0] ]
-        
-        # Run YOLOv8 inference
-        results = self.yolov8_model(
-            source=image,
-            imgsz=640,
-            conf=0.5,
-            device=0,
-            agnostic_nms=True,
-            classes=class_filter,
-            retina_masks=True,
-            verbose=False
-        )[0]
-
-        detections = sv.Detections.from_ultralytics(results)
-
-        tracks = self.byte_tracker.update_with_detections(detections)
-
-        for track in tracks:
-            if track[4] not in self.track_deque:
-                self.track_deque[track[4]] = deque(maxlen=64)
-
-        # Draw labels
-        labels = [f"{results.names[class_id]} - {tracker_id}" for _, _, _, class_id, tracker_id in tracks]
-
-        # Draw boxes
-        annotated_image = box_annotations(annotated_image, tracks, labels)
-
-        # Draw masks
-        if detections.mask is not None:
-            annotated_image = mask_annotations(annotated_image, detections)
-        
-        # Draw tracks
-        annotated_image = track_annotations(annotated_image, tracks, self.track_deque, 'centroid')
+        """ Request the current frame from the background worker """
+        self.pipeline.classes = [ value[1] for value in self.class_options.values() if value[0] ]
+        self.pipeline.imgsz = inference_size(self.model_size, self.half_resolution)
+        self.pipeline.conf = self.model_confidence
+        self.pipeline.device = device_key(self.model_device)
+        self.pipeline.use_region(self.region_detector)
+        if self.timer_play.isActive():
+            self.video_worker.start_playback(self.frame_number)
+        else:
+            self.video_worker.stop_playback()
+            self.video_worker.request_frame(self.frame_number)
+
+
+    def on_frame_ready(self, frame_number: int, annotated_image) -> None:
+        """ Show a frame processed by the background worker """
+        if self.profiler_overlay:
+            self.profiler.draw_overlay(annotated_image)
+        with self.profiler.measure('display'):
+            self.ui.gui_widgets['video_label'].set_frame(annotated_image)
+        self.profiled_frames += 1
+        if self.profiler_overlay and self.profiled_frames % 15 == 0:
+            self.update_profiler_chart()
+
+        self.ui.gui_widgets['video_slider'].setValue(frame_number)
+        self.ui.gui_widgets['frame_value_textfield'].text_field.setText(f"{frame_number}")
+
+        if self.pipeline.scheduler is not None:
+            scheduler = self.pipeline.scheduler
+            self.ui.gui_widgets['detection_rate_value'].setText(f"{scheduler.detection_rate():.1f} det/s (1/{scheduler.stride})")
+
+
+    def on_frame_failed(self, frame_number: int, message: str) -> None:
+        """ Stop playback and show why the background worker could not process a frame """
+        print(f"Frame {frame_number} failed: {message}")
+        if self.timer_play.isActive(): self.timer_play.stop()
+        if self.timer_reverse.isActive(): self.timer_reverse.stop()
 
-        qt_image = self.convert_cv_qt(annotated_image)
-        self.ui.gui_widgets['video_label'].setPixmap(qt_image)
+        # One dialog at a time, frames requested while it is open fail the same way
+        if self.error_message is None or not self.error_message.isVisible():
+            self.error_message = InfoMessageApp({
+                'type': 'error',
+                'size': (480, 160),
+                'messages': (
+                    f"No se pudo procesar el cuadro {frame_number}\n{message}",
+                    f"Frame {frame_number} could not be processed\n{message}"
+                )
+            })
+            self.error_message.show()
 
 
     def play_forward(self):
-        if (self.frame_number <= self.video_total_frames):
+        if self.timer_play.isActive():
+            # Playback frames come from the worker display queue
+            result = self.video_worker.next_frame()
+            if result is not None:
+                self.frame_number = result[0]
+                self.on_frame_ready(*result)
+            elif not self.video_worker.playing:
+                self.timer_play.stop()
+        elif (self.frame_number <= self.video_total_frames):
             self.frame_number += 1
             self.draw_frame()
 
-            self.ui.gui_widgets['video_slider'].setValue(self.frame_number)
-            self.ui.gui_widgets['frame_value_textfield'].text_field.setText(f"{self.frame_number}")
-
 
     def play_backward(self):
         if (self.frame_number > 0):
             self.frame_number -= 1
             self.draw_frame()
 
-            self.ui.gui_widgets['video_slider'].setValue(self.frame_number)
-            self.ui.gui_widgets['frame_value_textfield'].text_field.setText(f"{self.frame_number}")
-
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
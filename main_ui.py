@@ -10,6 +10,7 @@ from components.ui_chart import UI_Chart
 from components.ui_divider import UI_Divider
 from components.ui_numberbox import UI_NumberBox, UI_FloatBox
 from components.ui_slider import UI_Slider
+from components.ui_video_view import UI_VideoView
 
 import yaml
 
@@ -44,6 +45,12 @@ class Main_UI(QWidget):
             1: ('cpu', 'cpu')
         }
 
+        self.region_options = {
+            0: ('Cuadro completo', 'Full frame'),
+            1: ('Regiones de interés', 'Regions of interest'),
+            2: ('Mosaicos', 'Tiles')
+        }
+
         # -----------
         # Main Window
         # -----------
@@ -107,13 +114,26 @@ class Main_UI(QWidget):
             icon_name='plus',
             clicked_signal=parent.on_source_add_button_clicked )
 
+        self.gui_widgets['replay_button'] = UI_Button(
+            parent=self.gui_widgets['source_card'],
+            position=(96, 44),
+            type='accent',
+            icon_name='file-table-outline',
+            clicked_signal=parent.on_replay_button_clicked )
+
+        self.gui_widgets['profiler_button'] = UI_ToggleButton(
+            parent=self.gui_widgets['source_card'],
+            position=(56, 44),
+            icon_name='speedometer',
+            clicked_signal=parent.on_profiler_button_clicked )
+
         # ----------------
         # Card Information
         # ----------------
         self.gui_widgets['info_card'] = UI_Card(
             parent=parent,
             position=(16, 112),
-            size=(180, 184) )
+            size=(180, 216) )
         
         self.gui_widgets['info_label'] = UI_Label(
             parent=self.gui_widgets['info_card'],
@@ -161,13 +181,21 @@ class Main_UI(QWidget):
             texts=('CPS', 'FPS'),
             language=self.language_value )
 
+        self.gui_widgets['detection_rate_value'] = UI_Label(
+            parent=self.gui_widgets['info_card'],
+            position=(48, 176),
+            width=164,
+            align='left',
+            texts=('Detecciones/s', 'Detections/s'),
+            language=self.language_value )
+
         # ----------
         # Card Model
         # ----------
         self.gui_widgets['model_card'] = UI_Card(
             parent=parent,
-            position=(16, 304),
-            size=(180, 248) )
+            position=(16, 336),
+            size=(180, 288) )
         
         self.gui_widgets['model_label'] = UI_Label(
             parent=self.gui_widgets['model_card'],
@@ -209,17 +237,26 @@ class Main_UI(QWidget):
             options=self.device_options,
             language=self.language_value,
             activated_signal=parent.device_activated )
+
+        self.gui_widgets['region_menu'] = UI_ComboBox(
+            parent=self.gui_widgets['model_card'],
+            position=(4, 204),
+            width=self.gui_widgets['model_card'].width() - 8,
+            options=self.region_options,
+            set=0,
+            language=self.language_value,
+            activated_signal=parent.region_activated )
         
         self.gui_widgets['model_start_button'] = UI_Button(
             parent=self.gui_widgets['model_card'],
-            position=(136, 204),
+            position=(136, 244),
             type='accent',
             icon_name='play-circle-outline',
             clicked_signal=parent.model_start_button_clicked )
 
         self.gui_widgets['model_stop_button'] = UI_Button(
             parent=self.gui_widgets['model_card'],
-            position=(96, 204),
+            position=(96, 244),
             type='accent',
             icon_name='stop-circle-outline',
             clicked_signal=parent.model_stop_button_clicked )
@@ -286,6 +323,28 @@ class Main_UI(QWidget):
         #     'language': self.language_value,
         #     'return_pressed': parent.on_frame_value_textfield_returnPressed } )
 
+        # ----------------
+        # Card Video Image
+        # ----------------
+        self.gui_widgets['video_output_card'] = UI_Card(
+            parent=parent,
+            position=(204, 72),
+            size=(width - 220, height - 88) )
+
+        self.gui_widgets['video_label'] = UI_VideoView(
+            parent=self.gui_widgets['video_output_card'],
+            position=(8, 8),
+            size=(width - 236, height - 104),
+            polygons_changed_signal=parent.on_polygons_changed )
+
+        self.gui_widgets['profiler_chart'] = UI_Chart(
+            parent=self.gui_widgets['video_output_card'],
+            position=(width - 596, height - 304),
+            size=(360, 200),
+            texts=('Tiempo por etapa (ms)', 'Time per stage (ms)'),
+            language=self.language_value )
+        self.gui_widgets['profiler_chart'].setVisible(False)
+
         # # ----------------
         # # Card Video Image
         # # ----------------
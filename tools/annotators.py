@@ -3,7 +3,9 @@ from supervision.detection.core import Detections
 
 import cv2
 import numpy as np
-from collections import deque
+from collections import OrderedDict
+
+from tools.track_history import TrackHistory
 
 from icecream import ic
 
@@ -19,11 +21,77 @@ COLOR_LIST = sv.ColorPalette.from_hex([
 ])
 
 
-def box_annotations(scene: np.ndarray, detections: Detections, labels: list = None) -> np.ndarray:
+class AnnotationCache:
+    """ Colours, label text sizes and label sprites reused across frames """
+    def __init__(self, max_labels: int = 1024, sprites: bool = False):
+        """
+        Parameters
+        ----------
+            max_labels (int): Maximum number of label strings kept, least recently used are evicted
+            sprites (bool): Blit pre-rendered label images instead of drawing them on every frame
+        """
+        self.max_labels = max_labels
+        self.use_sprites = sprites
+
+        self.colors = [color.as_bgr() for color in COLOR_LIST.colors]
+        self.text_sizes = OrderedDict()
+        self.sprites = OrderedDict()
+
+    def color(self, class_id: int) -> tuple[int, int, int]:
+        return self.colors[class_id % len(self.colors)]
+
+    def _lru_get(self, store: OrderedDict, key, build: callable):
+        if key in store:
+            store.move_to_end(key)
+            return store[key]
+        value = build()
+        store[key] = value
+        if len(store) > self.max_labels:
+            store.popitem(last=False)
+        return value
+
+    def text_size(self, text: str) -> tuple[int, int]:
+        return self._lru_get(self.text_sizes, text, lambda: cv2.getTextSize(
+            text=text,
+            fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+            fontScale=0.3,
+            thickness=1,
+        )[0])
+
+    def sprite(self, text: str, color: tuple[int, int, int]) -> np.ndarray:
+        """ Label background and text rendered once, as drawn by box_annotations """
+        def build():
+            text_width, text_height = self.text_size(text)
+            sprite = np.empty((text_height + 7, text_width + 7, 3), dtype=np.uint8)
+            sprite[:] = color
+            cv2.putText(
+                img=sprite,
+                text=text,
+                org=(3, text_height + 3),
+                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+                fontScale=0.3,
+                color=(0,0,0),
+                thickness=1,
+                lineType=cv2.LINE_AA,
+            )
+            return sprite
+        return self._lru_get(self.sprites, (text, color), build)
+
+
+def blit(scene: np.ndarray, sprite: np.ndarray, x: int, y: int) -> None:
+    """ Copy sprite on scene with its top left corner at (x, y), clipped to the scene """
+    height, width = scene.shape[:2]
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + sprite.shape[1], width), min(y + sprite.shape[0], height)
+    if x1 < x2 and y1 < y2:
+        scene[y1:y2, x1:x2] = sprite[y1 - y:y2 - y, x1 - x:x2 - x]
+
+
+def box_annotations(scene: np.ndarray, detections: Detections, labels: list = None, cache: AnnotationCache = None) -> np.ndarray:
     for index, detection in enumerate(detections):
         x1, y1, x2, y2 = detection[0].astype(int)
         
-        color = COLOR_LIST.by_idx(detection[3]).as_bgr()
+        color = COLOR_LIST.by_idx(detection[3]).as_bgr() if cache is None else cache.color(detection[3])
         
         cv2.rectangle(img=scene,pt1=(x1, y1),pt2=(x2, y2),color=color,thickness=1)
         
@@ -31,16 +99,23 @@ def box_annotations(scene: np.ndarray, detections: Detections, labels: list = No
         if labels is not None: 
             text = labels[index]
 
-            (text_width, text_height), _ = cv2.getTextSize(
-                text=text,
-                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
-                fontScale=0.3,
-                thickness=1,
-            )
+            if cache is None:
+                (text_width, text_height), _ = cv2.getTextSize(
+                    text=text,
+                    fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+                    fontScale=0.3,
+                    thickness=1,
+                )
+            else:
+                text_width, text_height = cache.text_size(text)
 
             text_background_x1 = x1 if x1 > 0 else x2 - 6 - text_width
             text_background_y1 = y1 - 6 - text_height if y1 - 6 - text_height > 0 else y2
 
+            if cache is not None and cache.use_sprites:
+                blit(scene, cache.sprite(text, color), text_background_x1, text_background_y1)
+                continue
+
             text_background_x2 = text_background_x1 + 6 + text_width
             text_background_y2 = text_background_y1 + 6 + text_height
             
@@ -69,47 +144,88 @@ def box_annotations(scene: np.ndarray, detections: Detections, labels: list = No
     return scene
 
 
-def track_annotations(scene: np.ndarray, tracks: Detections, track_deque: deque, position: str = 'centroid') -> np.ndarray:
-    track_positions = {
-        'top_left': lambda x1, y1, x2, y2 : tuple(map(int, (x1, y1))),
-        'top_center': lambda x1, y1, x2, y2 : tuple(map(int, ((x2+x1)/2, y1))),
-        'top_right': lambda x1, y1, x2, y2 : tuple(map(int, (x2, y1))),
-        'center_left': lambda x1, y1, x2, y2 : tuple(map(int, (x1, (y2+y1)/2))),
-        'centroid': lambda x1, y1, x2, y2 : tuple(map(int, ((x2+x1)/2, (y2+y1)/2))),
-        'center_right': lambda x1, y1, x2, y2 : tuple(map(int, (x2, (y2+y1)/2))),
-        'bottom_left': lambda x1, y1, x2, y2 : tuple(map(int, (x1, y2))),
-        'bottom_center': lambda x1, y1, x2, y2 : tuple(map(int, ((x2+x1)/2, y2))),
-        'bottom_right': lambda x1, y1, x2, y2 : tuple(map(int, (x2, y2)))
-    }
-
-    for track in tracks:
-        xyxy, _, _, class_id, tracker_id = track
-        x1, y1, x2, y2 = xyxy.astype(int)
+TRACK_ANCHORS = {
+    'top_left': lambda x1, y1, x2, y2: (x1, y1),
+    'top_center': lambda x1, y1, x2, y2: ((x2+x1)/2, y1),
+    'top_right': lambda x1, y1, x2, y2: (x2, y1),
+    'center_left': lambda x1, y1, x2, y2: (x1, (y2+y1)/2),
+    'centroid': lambda x1, y1, x2, y2: ((x2+x1)/2, (y2+y1)/2),
+    'center_right': lambda x1, y1, x2, y2: (x2, (y2+y1)/2),
+    'bottom_left': lambda x1, y1, x2, y2: (x1, y2),
+    'bottom_center': lambda x1, y1, x2, y2: ((x2+x1)/2, y2),
+    'bottom_right': lambda x1, y1, x2, y2: (x2, y2)
+}
+
+
+def track_anchors(xyxy: np.ndarray, position: str = 'centroid') -> np.ndarray:
+    """
+    Anchor point of every box, shape (N, 2)
+    """
+    x1, y1, x2, y2 = xyxy.astype(int).T
+    x, y = TRACK_ANCHORS[position](x1, y1, x2, y2)
+
+    return np.stack([x, y], axis=1).astype(np.int32)
+
+
+def track_annotations(scene: np.ndarray, tracks: Detections, track_history: TrackHistory, position: str = 'centroid', fade_steps: int = 0) -> np.ndarray:
+    """
+    Draw track trails on frame, one cv2.polylines call per class colour.
+    With fade_steps > 0 the trail is split in that many parts by age, each
+    one darker than the previous
+    """
+    if len(tracks) == 0:
+        track_history.update([], [])
+        return scene
+
+    track_history.update(tracks.tracker_id, track_anchors(tracks.xyxy, position))
+
+    trails = {}
+    for class_id, tracker_id in zip(tracks.class_id, tracks.tracker_id):
+        track_points = track_history.points(tracker_id)
+        if len(track_points) > 1:
+            trails.setdefault(class_id, []).append(track_points)
+
+    part_length = -(-track_history.maxlen // fade_steps) if fade_steps > 0 else track_history.maxlen
+    for class_id, class_trails in trails.items():
         color = COLOR_LIST.by_idx(class_id).as_bgr()
-        
-        # Draw track line
-        track_deque[tracker_id].appendleft(track_positions[position](x1, y1, x2, y2))
+        for step, start in enumerate(range(0, track_history.maxlen - 1, part_length)):
+            parts = [points[start:start + part_length + 1] for points in class_trails if len(points) > start + 1]
+            if not parts:
+                break
+            step_color = color if step == 0 else tuple(int(c * (1 - step / fade_steps)) for c in color)
+            cv2.polylines(scene, parts, False, step_color, 1, cv2.LINE_AA)
 
-        for point1, point2 in zip(list(track_deque[tracker_id]), list(track_deque[tracker_id])[1:]):
-            cv2.line(scene, point1, point2, color, 1, cv2.LINE_AA)
-    
     return scene
 
 
 def mask_annotations(scene: np.ndarray, detections: Detections) -> np.ndarray:
-    for detection in detections:
-        mask = detection[1]
+    """
+    Blend object masks on frame, working only inside each detection box,
+    rounded outward and clipped to the frame. Mask pixels outside the box,
+    which YOLO crops away, are not drawn. Masks are blended in detection
+    order, so overlaps match a full-frame blend
+    """
+    if detections.mask is None:
+        return scene
 
-        color = COLOR_LIST.by_idx(detection[3]).as_bgr()
-        
-        colored_mask = np.zeros_like(scene, dtype=np.uint8)
-        colored_mask[:] = color
-
-        scene = np.where(
-            np.expand_dims(mask, axis=-1),
-            np.uint8(0.5 * colored_mask + (1 - 0.5) * scene),
-            scene,
-        )
+    height, width = scene.shape[:2]
+    boxes = np.column_stack([np.floor(detections.xyxy[:, :2]), np.ceil(detections.xyxy[:, 2:])]).astype(int)
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+
+    for mask, class_id, (x1, y1, x2, y2) in zip(detections.mask, detections.class_id, boxes):
+        if x2 <= x1 or y2 <= y1:
+            continue
+        region_mask = mask[y1:y2, x1:x2]
+        if not region_mask.any():
+            continue
+
+        color = np.array(COLOR_LIST.by_idx(class_id).as_bgr(), dtype=np.uint16)
+
+        # Half-and-half blend, (color + pixel) // 2 as the float blend truncated
+        region = scene[y1:y2, x1:x2]
+        blended = ((region + color) >> 1).astype(np.uint8)
+        np.copyto(region, blended, where=region_mask[:, :, None])
 
     return scene
 
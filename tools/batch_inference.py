@@ -0,0 +1,140 @@
+from ultralytics import YOLO
+import supervision as sv
+
+import cv2
+import time
+import argparse
+
+from tools.frame_source import FrameSource
+from tools.pipeline import FramePipeline
+from tools.staged_pipeline import Stage, StagedPipeline
+from tools.columnar_results import open_results_writer
+
+
+def process_video(
+    source: str,
+    pipeline: FramePipeline,
+    batch_size: int = 8,
+    save_path: str = None,
+    max_frames: int = None,
+    video_path: str = None,
+    start_frame: int = 0
+) -> dict:
+    """ Detect and track every frame of a video with batched inference
+
+    Frames are decoded ahead in batches of batch_size while the previous
+    batch is in the model. Detections are passed to the tracker in frame
+    order, so the tracks match the per-frame path of draw_frame.
+
+    Parameters
+    ----------
+        source (str): Video file path
+        pipeline (FramePipeline): Pipeline with the model and a fresh tracker
+        batch_size (int): Frames per inference call
+        save_path (str): Tracks file, CSV, .parquet or .npz. None skips writing
+        max_frames (int): Process only the first max_frames frames from start_frame
+        video_path (str): Annotated output video. None skips annotation
+        start_frame (int): First frame to process
+
+    Returns
+    -------
+        dict: Batch size, processed frames, elapsed seconds and frames per second
+    """
+    frame_source = FrameSource(source)
+    end_frame = frame_source.total_frames
+    if max_frames is not None:
+        end_frame = min(end_frame, start_frame + max_frames)
+
+    video_writer = None
+    if video_path is not None:
+        video_writer = cv2.VideoWriter(
+            video_path,
+            cv2.VideoWriter_fourcc(*'mp4v'),
+            frame_source.fps,
+            (int(frame_source.width), int(frame_source.height))
+        )
+
+    results_writer = open_results_writer(save_path, pipeline.class_names) if save_path is not None else None
+
+    batches = (range(start, min(start + batch_size, end_frame)) for start in range(start_frame, end_frame, batch_size))
+    processed_frames = 0
+
+    def decode(frame_numbers):
+        images = []
+        for frame_number in frame_numbers:
+            success, image = frame_source.read(frame_number)
+            if not success:
+                break
+            images.append(image)
+        return frame_numbers[:len(images)], images
+
+    def infer(item):
+        frame_numbers, images = item
+        return frame_numbers, images, pipeline.detect_batch(images) if images else []
+
+    def track(item):
+        nonlocal processed_frames
+        frame_numbers, images, detections_batch = item
+        for frame_number, image, detections in zip(frame_numbers, images, detections_batch):
+            tracks = pipeline.track(detections)
+            if results_writer is not None:
+                results_writer.write_tracks(frame_number, tracks)
+            if video_writer is not None:
+                video_writer.write(pipeline.annotate(image, detections, tracks))
+        processed_frames += len(frame_numbers)
+
+    staged_pipeline = StagedPipeline([
+        Stage('decode', decode, ordered=True),
+        Stage('infer', infer),
+        Stage('track', track, ordered=True)
+    ], queue_size=2)
+
+    start_time = time.perf_counter()
+    staged_pipeline.start(batches)
+    for _ in staged_pipeline.results():
+        pass
+    elapsed = time.perf_counter() - start_time
+    staged_pipeline.stop()
+    frame_source.release()
+    if results_writer is not None:
+        results_writer.close()
+    if video_writer is not None:
+        video_writer.release()
+
+    return {
+        'batch_size': batch_size,
+        'frames': processed_frames,
+        'seconds': elapsed,
+        'fps': processed_frames / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def benchmark_batch_sizes(source: str, weights: str, batch_sizes: list[int], max_frames: int = None, classes: list = None) -> list[dict]:
+    """ Print frames per second of process_video for each batch size """
+    model = YOLO(weights)
+    results = []
+    for batch_size in batch_sizes:
+        pipeline = FramePipeline(model, sv.ByteTrack(), classes)
+        stats = process_video(source, pipeline, batch_size, max_frames=max_frames)
+        print(f"batch {batch_size:>3}: {stats['frames']} frames in {stats['seconds']:.2f} s, {stats['fps']:.2f} frames/s")
+        results.append(stats)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Batched offline detection and tracking')
+    parser.add_argument('source', help='video file')
+    parser.add_argument('--weights', default='weights/yolov8m.pt')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--classes', type=int, nargs='*', default=None)
+    parser.add_argument('--output', default=None, help='CSV file for tracks, written with the first batch size')
+    args = parser.parse_args()
+
+    if args.output is not None:
+        pipeline = FramePipeline(YOLO(args.weights), sv.ByteTrack(), args.classes)
+        stats = process_video(args.source, pipeline, args.batch_sizes[0], args.output, args.max_frames)
+        print(f"batch {stats['batch_size']:>3}: {stats['frames']} frames in {stats['seconds']:.2f} s, {stats['fps']:.2f} frames/s")
+    else:
+        benchmark_batch_sizes(args.source, args.weights, args.batch_sizes, args.max_frames, args.classes)
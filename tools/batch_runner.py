@@ -0,0 +1,205 @@
+import supervision as sv
+
+import os
+import json
+import glob
+import time
+import pathlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tools.pipeline import FramePipeline
+from tools.cpu_profile import default_device, exported_weights, inference_size, load_model, set_cpu_threads
+from tools.batch_inference import process_video
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# Model loaded once by each worker process
+_model = None
+
+
+def expand_sources(pattern: str) -> list[str]:
+    """ Video files in a directory or matching a glob pattern, sorted """
+    path = pathlib.Path(pattern)
+    if path.is_dir():
+        files = [str(file) for file in path.rglob('*') if file.suffix.lower() in VIDEO_EXTENSIONS]
+    else:
+        files = glob.glob(pattern, recursive=True)
+
+    return sorted(files)
+
+
+def output_paths(sources: list[str], out_dir: str) -> dict[str, str]:
+    """ Tracks file of every source, mirroring its path below the common directory of the sources
+
+    cam1/clip001.mp4 and cam2/clip001.mp4 go to <out_dir>/cam1/clip001.csv
+    and <out_dir>/cam2/clip001.csv. Sources differing only in extension keep
+    it in the name, as clip001.mp4.csv
+    """
+    if not sources:
+        return {}
+
+    root = pathlib.Path(os.path.commonpath([str(pathlib.Path(source).resolve().parent) for source in sources]))
+    relative = {source: pathlib.Path(source).resolve().relative_to(root) for source in sources}
+    stems = {}
+    for path in relative.values():
+        stem = path.with_suffix('')
+        stems[stem] = stems.get(stem, 0) + 1
+
+    outputs = {}
+    for source, path in relative.items():
+        name = path.with_suffix('.csv') if stems[path.with_suffix('')] == 1 else path.with_name(f"{path.name}.csv")
+        outputs[source] = str(pathlib.Path(out_dir) / name)
+
+    return outputs
+
+
+def make_pipeline(model, settings: dict) -> FramePipeline:
+    """ Pipeline with a fresh tracker and the given model settings
+
+    Parameters
+    ----------
+        model (YOLO): Ultralytics detection model
+        settings (dict): Model settings
+            Keys: 'weights', 'imgsz', 'conf', 'device', 'classes', 'half_resolution'
+            A device of None is the first GPU, or the CPU without CUDA
+    """
+    pipeline = FramePipeline(model, sv.ByteTrack(), settings.get('classes'), weights=pathlib.Path(settings['weights']).name)
+    pipeline.imgsz = inference_size(settings.get('imgsz', pipeline.imgsz), settings.get('half_resolution', False))
+    pipeline.conf = settings.get('conf', pipeline.conf)
+    device = str(settings.get('device') or default_device())
+    pipeline.device = int(device) if device.isdigit() else device
+
+    return pipeline
+
+
+def load_settings_model(settings: dict):
+    """ Set the CPU threads and load the model of the settings
+
+    Parameters
+    ----------
+        settings (dict): Model settings, see make_pipeline. Also 'threads'
+            and 'export', 'onnx' or 'openvino' to run an exported model
+    """
+    set_cpu_threads(settings.get('threads'))
+    imgsz = inference_size(settings.get('imgsz', 640), settings.get('half_resolution', False))
+
+    return load_model(settings['weights'], settings.get('export'), imgsz)
+
+
+def export_settings_model(settings: dict) -> None:
+    """ Export the model of the settings when they ask for an export
+
+    Runs in the parent before the worker processes start, so the workers
+    load the existing export instead of all exporting the same weights
+    """
+    if settings.get('export') is not None:
+        imgsz = inference_size(settings.get('imgsz', 640), settings.get('half_resolution', False))
+        exported_weights(settings['weights'], settings['export'], imgsz)
+
+
+def _init_worker(settings: dict) -> None:
+    global _model
+    _model = load_settings_model(settings)
+
+
+def _process_file(source: str, output: str, settings: dict) -> dict:
+    """ Track one file in a worker process, writing the output tracks file """
+    output = pathlib.Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(f"{output.name}.part")
+    if partial.exists():
+        partial.unlink()
+
+    pipeline = make_pipeline(_model, settings)
+    stats = process_video(source, pipeline, settings.get('batch_size', 8), str(partial))
+    if partial.exists():
+        partial.replace(output)
+    else:
+        output.touch()
+
+    stats['source'] = source
+    stats['output'] = str(output)
+
+    return stats
+
+
+class BatchRunner:
+    """ Track many video files over a process pool, resuming from a checkpoint
+
+    Every worker process loads the model once and reuses it for all its
+    files, with a fresh tracker per file. Tracks files mirror the source
+    paths, see output_paths. Completed files are appended to
+    checkpoint.jsonl in the output directory and skipped on the next run.
+    """
+    def __init__(self, sources: list[str], out_dir: str, settings: dict, workers: int = 2):
+        """
+        Parameters
+        ----------
+            sources (list[str]): Video files
+            out_dir (str): Directory for track files and the checkpoint
+            settings (dict): Model settings, see make_pipeline. Also 'batch_size'
+            workers (int): Worker processes
+        """
+        self.sources = sources
+        self.out_dir = pathlib.Path(out_dir)
+        self.settings = settings
+        self.workers = workers
+        self.checkpoint = self.out_dir / 'checkpoint.jsonl'
+
+        # Counters
+        self.frames = 0
+        self.files = 0
+        self.failed = 0
+
+    def completed(self) -> set[str]:
+        """ Sources already processed according to the checkpoint """
+        if not self.checkpoint.exists():
+            return set()
+        with open(self.checkpoint, 'r') as file:
+            return {json.loads(line)['source'] for line in file if line.strip()}
+
+    def run(self) -> dict:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        done = self.completed()
+        pending = [source for source in self.sources if source not in done]
+        print(f"{len(pending)} files to process, {len(done)} already done")
+
+        start_time = time.perf_counter()
+        export_settings_model(self.settings)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, context, _init_worker, (self.settings,)) as executor:
+            outputs = output_paths(self.sources, str(self.out_dir))
+            futures = {executor.submit(_process_file, source, outputs[source], self.settings): source for source in pending}
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as error:
+                    self.failed += 1
+                    print(f"{source}: failed, {error}")
+                    continue
+
+                with open(self.checkpoint, 'a') as file:
+                    file.write(json.dumps(stats) + '\n')
+
+                self.frames += stats['frames']
+                self.files += 1
+                print(f"{source}: {stats['frames']} frames, {stats['fps']:.2f} frames/s | {self.report(time.perf_counter() - start_time)}")
+
+        return self.stats(time.perf_counter() - start_time)
+
+    def report(self, elapsed: float) -> str:
+        stats = self.stats(elapsed)
+        return f"total {stats['fps']:.2f} frames/s, {stats['files_per_hour']:.1f} files/h"
+
+    def stats(self, elapsed: float) -> dict:
+        return {
+            'files': self.files,
+            'failed': self.failed,
+            'frames': self.frames,
+            'seconds': elapsed,
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'files_per_hour': 3600 * self.files / elapsed if elapsed > 0 else 0.0
+        }
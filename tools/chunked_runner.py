@@ -0,0 +1,235 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+import csv
+import time
+import pathlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from tools import batch_runner
+from tools.batch_runner import make_pipeline
+from tools.batch_inference import process_video
+from tools.frame_source import FrameSource
+
+
+def split_chunks(total_frames: int, chunks: int, overlap: int) -> list[tuple[int, int, int]]:
+    """ Frame ranges of the chunks of a video
+
+    Returns
+    -------
+        list[tuple[int, int, int]]: First decoded frame, first owned frame and
+            end frame of each chunk. Frames from the first decoded frame to the
+            first owned frame are also owned by the previous chunk
+    """
+    chunks = max(1, min(chunks, total_frames))
+    bounds = np.linspace(0, total_frames, chunks + 1).astype(int)
+
+    return [(max(0, int(start) - overlap), int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def read_tracks(path: str):
+    """ Rows of a tracks CSV file written by ResultsWriter.write_tracks, yielded one at a time """
+    if not pathlib.Path(path).exists():
+        return
+
+    with open(path, 'r', newline='') as csv_file:
+        for row in csv.reader(csv_file):
+            yield [int(row[0]), int(row[1]), row[2], int(row[3]), int(row[4]), int(row[5]), int(row[6]), row[7]]
+
+
+def _process_chunk(source: str, chunk: tuple[int, int, int], part_path: str, settings: dict) -> dict:
+    """ Track the frames of one chunk in a worker process, writing part_path """
+    first, _, end = chunk
+    pipeline = make_pipeline(batch_runner._model, settings)
+
+    return process_video(source, pipeline, settings.get('batch_size', 8), part_path, end - first, start_frame=first)
+
+
+def _box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """ IoU matrix of two arrays of x, y, w, h boxes """
+    a = np.concatenate([boxes_a[:, :2], boxes_a[:, :2] + boxes_a[:, 2:]], axis=1).astype(np.float64)
+    b = np.concatenate([boxes_b[:, :2], boxes_b[:, :2] + boxes_b[:, 2:]], axis=1).astype(np.float64)
+
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def match_tracks(previous_rows: list[list], current_rows: list[list], min_iou: float = 0.5) -> dict[int, int]:
+    """ Tracker ids of the current chunk matched to ids of the previous chunk
+
+    Both row lists hold the tracks of the same overlap frames. A pair of ids
+    of the same class is scored by its IoU summed over the overlap frames,
+    divided by the frames where either id is present. Pairs are assigned
+    one to one for the highest total score and kept above min_iou.
+
+    Returns
+    -------
+        dict[int, int]: Current tracker id to previous tracker id
+    """
+    previous_ids = sorted({row[1] for row in previous_rows})
+    current_ids = sorted({row[1] for row in current_rows})
+    if not previous_ids or not current_ids:
+        return {}
+    previous_index = {tracker_id: i for i, tracker_id in enumerate(previous_ids)}
+    current_index = {tracker_id: i for i, tracker_id in enumerate(current_ids)}
+
+    # Overlap frames where each id is present
+    previous_frames = np.zeros(len(previous_ids))
+    current_frames = np.zeros(len(current_ids))
+    for row in previous_rows:
+        previous_frames[previous_index[row[1]]] += 1
+    for row in current_rows:
+        current_frames[current_index[row[1]]] += 1
+
+    previous_by_frame = {}
+    for row in previous_rows:
+        previous_by_frame.setdefault(row[0], []).append(row)
+    current_by_frame = {}
+    for row in current_rows:
+        current_by_frame.setdefault(row[0], []).append(row)
+
+    iou_sum = np.zeros((len(previous_ids), len(current_ids)))
+    for frame_number, rows_a in previous_by_frame.items():
+        rows_b = current_by_frame.get(frame_number)
+        if not rows_b:
+            continue
+        iou = _box_iou(np.array([row[3:7] for row in rows_a]), np.array([row[3:7] for row in rows_b]))
+        same_class = np.array([row[2] for row in rows_a])[:, None] == np.array([row[2] for row in rows_b])[None, :]
+        rows = [previous_index[row[1]] for row in rows_a]
+        cols = [current_index[row[1]] for row in rows_b]
+        np.add.at(iou_sum, (np.array(rows)[:, None], np.array(cols)[None, :]), iou * same_class)
+
+    score = iou_sum / np.maximum(previous_frames[:, None], current_frames[None, :])
+    rows, cols = linear_sum_assignment(score, maximize=True)
+
+    return {current_ids[col]: previous_ids[row] for row, col in zip(rows, cols) if score[row, col] >= min_iou}
+
+
+def stitch_tracks(chunks: list[tuple[int, int, int]], chunk_rows, writer, min_iou: float = 0.5) -> tuple[int, int]:
+    """ Write the rows of all chunks with tracker ids consistent across chunk boundaries
+
+    Every chunk keeps the rows of the frames it owns. Its tracker ids are
+    replaced by the stitched ids of the previous chunk they match in the
+    overlap frames, or by new ids in order of appearance. Rows are read and
+    written one chunk after the other, only the overlap frames are held.
+
+    Parameters
+    ----------
+        chunks (list[tuple[int, int, int]]): Frame ranges, see split_chunks
+        chunk_rows (iterable): Rows of each chunk in frame order, see read_tracks
+        writer (csv.writer): Writer of the stitched rows
+        min_iou (float): Overlap score of tracks continued across a boundary
+
+    Returns
+    -------
+        (int, int): Rows written and number of tracks continued across a boundary
+    """
+    written = 0
+    stitched_tracks = 0
+    next_id = 1
+    previous_ids = {}
+    previous_rows = []
+    for index, ((first, start, end), rows) in enumerate(zip(chunks, chunk_rows)):
+        next_first = chunks[index + 1][0] if index + 1 < len(chunks) else end
+        rows = iter(rows)
+
+        # Overlap frames as tracked by this chunk, before the frames it owns
+        overlap = []
+        row = next(rows, None)
+        while row is not None and row[0] < start:
+            if row[0] >= first:
+                overlap.append(row)
+            row = next(rows, None)
+
+        matches = match_tracks([previous_row for previous_row in previous_rows if first <= previous_row[0] < start], overlap, min_iou)
+        stitched_tracks += len(matches)
+        ids = {tracker_id: previous_ids[previous_id] for tracker_id, previous_id in matches.items()}
+
+        # Owned frames, the last ones are the overlap of the next chunk
+        tail = []
+        while row is not None and row[0] < end:
+            if row[1] not in ids:
+                ids[row[1]] = next_id
+                next_id += 1
+            if row[0] >= next_first:
+                tail.append(row)
+            writer.writerow([row[0], ids[row[1]], *row[2:]])
+            written += 1
+            row = next(rows, None)
+
+        previous_ids = ids
+        previous_rows = tail
+
+    return written, stitched_tracks
+
+
+class ChunkedRunner:
+    """ Track one long video over a process pool, split into overlapping chunks
+
+    Every chunk starts overlap frames before the frames it owns, so its
+    tracker is warm at the boundary, and its tracks in those frames are
+    matched to the tracks of the previous chunk to keep tracker ids
+    consistent in the single output file.
+    """
+    def __init__(self, source: str, save_path: str, settings: dict, workers: int = 4, chunks: int = None, overlap: int = 30):
+        """
+        Parameters
+        ----------
+            source (str): Video file path
+            save_path (str): CSV file for the stitched tracks
+            settings (dict): Model settings, see make_pipeline. Also 'batch_size'
+            workers (int): Worker processes
+            chunks (int): Number of chunks. None uses one chunk per worker
+            overlap (int): Frames decoded by two neighbouring chunks
+        """
+        self.source = source
+        self.save_path = pathlib.Path(save_path)
+        self.settings = settings
+        self.workers = workers
+        self.chunks = chunks if chunks is not None else workers
+        self.overlap = overlap
+
+    def part_path(self, index: int) -> pathlib.Path:
+        return self.save_path.with_name(f"{self.save_path.name}.part{index}")
+
+    def run(self) -> dict:
+        frame_source = FrameSource(self.source)
+        total_frames = frame_source.total_frames
+        frame_source.release()
+
+        chunks = split_chunks(total_frames, self.chunks, self.overlap)
+        for index in range(len(chunks)):
+            self.part_path(index).unlink(missing_ok=True)
+
+        start_time = time.perf_counter()
+        batch_runner.export_settings_model(self.settings)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(self.workers, context, batch_runner._init_worker, (self.settings,)) as executor:
+            futures = [
+                executor.submit(_process_chunk, self.source, chunk, str(self.part_path(index)), self.settings)
+                for index, chunk in enumerate(chunks)
+            ]
+            decoded_frames = sum(future.result()['frames'] for future in futures)
+
+        part_rows = (read_tracks(self.part_path(index)) for index in range(len(chunks)))
+        with open(self.save_path, 'w', newline='') as csv_file:
+            rows, stitched_tracks = stitch_tracks(chunks, part_rows, csv.writer(csv_file))
+        for index in range(len(chunks)):
+            self.part_path(index).unlink(missing_ok=True)
+        elapsed = time.perf_counter() - start_time
+
+        return {
+            'chunks': len(chunks),
+            'frames': total_frames,
+            'decoded_frames': decoded_frames,
+            'rows': rows,
+            'stitched_tracks': stitched_tracks,
+            'seconds': elapsed,
+            'fps': total_frames / elapsed if elapsed > 0 else 0.0
+        }
@@ -0,0 +1,261 @@
+from supervision.detection.core import Detections
+
+import json
+import pathlib
+import zipfile
+import numpy as np
+
+from tools.write_csv import ResultsWriter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+COLUMNS = {
+    'frame': np.int32,
+    'tracker_id': np.int32,
+    'class_id': np.int16,
+    'x': np.int32,
+    'y': np.int32,
+    'w': np.int32,
+    'h': np.int32,
+    'confidence': np.float32
+}
+
+COLUMNAR_SUFFIXES = ('.parquet', '.npz')
+
+
+def open_results_writer(save_path: str, class_names: dict, mode: str = 'a'):
+    """ Tracks writer for the format of the file suffix
+
+    Parameters
+    ----------
+        save_path (str): Tracks file, .parquet or .npz for columnar files,
+            any other suffix for CSV
+        class_names (dict): Class names by class id
+        mode (str): CSV file mode, columnar files are always overwritten
+
+    Returns
+    -------
+        ColumnarWriter | ResultsWriter: Writer with write_tracks and close
+    """
+    if pathlib.Path(save_path).suffix in COLUMNAR_SUFFIXES:
+        return ColumnarWriter(save_path, class_names)
+    return ResultsWriter(save_path, class_names, mode=mode)
+
+
+class ColumnarWriter:
+    """ Tracks stored as typed columns in row groups
+
+    Rows are buffered as NumPy arrays and written every row_group_size
+    rows. With pyarrow installed a .parquet path is written as Parquet, with
+    frame and tracker id statistics per row group. Otherwise, or with a .npz
+    path, every row group is an array per column in a .npz archive, with a
+    row_groups table of frame and tracker id ranges written on close.
+    """
+    def __init__(self, save_path: str, class_names: dict, row_group_size: int = 65536):
+        """
+        Parameters
+        ----------
+            save_path (str): Tracks file. A .parquet path becomes .npz without pyarrow
+            class_names (dict): Class names by class id, stored with the tracks
+            row_group_size (int): Rows per row group
+        """
+        self.save_path = pathlib.Path(save_path)
+        self.class_names = {int(class_id): name for class_id, name in class_names.items()}
+        self.row_group_size = row_group_size
+
+        if self.save_path.suffix == '.parquet' and pq is not None:
+            self.format = 'parquet'
+            schema = pa.schema(
+                [(name, pa.from_numpy_dtype(dtype)) for name, dtype in COLUMNS.items()],
+                metadata={'class_names': json.dumps(self.class_names)}
+            )
+            self.writer = pq.ParquetWriter(self.save_path, schema)
+        else:
+            self.format = 'npz'
+            self.save_path = self.save_path.with_suffix('.npz')
+            self.writer = zipfile.ZipFile(self.save_path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+            self.row_groups = []
+
+        self.buffer = {name: [] for name in COLUMNS}
+        self.buffered_rows = 0
+        self.closed = False
+
+        # Counters
+        self.rows = 0
+
+    def __enter__(self) -> 'ColumnarWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write_tracks(self, frame_number: int, tracks: Detections) -> None:
+        """ Buffer a row per track """
+        count = len(tracks)
+        if count == 0:
+            return
+
+        xyxy = tracks.xyxy
+        columns = {
+            'frame': np.full(count, frame_number),
+            'tracker_id': tracks.tracker_id,
+            'class_id': tracks.class_id,
+            'x': xyxy[:, 0],
+            'y': xyxy[:, 1],
+            'w': xyxy[:, 2] - xyxy[:, 0],
+            'h': xyxy[:, 3] - xyxy[:, 1],
+            'confidence': tracks.confidence if tracks.confidence is not None else np.full(count, np.nan)
+        }
+        for name, dtype in COLUMNS.items():
+            self.buffer[name].append(columns[name].astype(dtype))
+        self.buffered_rows += count
+        self.rows += count
+
+        if self.buffered_rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """ Write buffered rows as one row group """
+        if self.buffered_rows == 0:
+            return
+
+        columns = {name: np.concatenate(arrays) for name, arrays in self.buffer.items()}
+        if self.format == 'parquet':
+            self.writer.write_table(pa.table(columns), row_group_size=self.buffered_rows)
+        else:
+            group = len(self.row_groups)
+            for name, array in columns.items():
+                self._write_array(f"{name}_{group}", array)
+            self.row_groups.append([
+                self.buffered_rows,
+                columns['frame'].min(), columns['frame'].max(),
+                columns['tracker_id'].min(), columns['tracker_id'].max()
+            ])
+
+        self.buffer = {name: [] for name in COLUMNS}
+        self.buffered_rows = 0
+
+    def _write_array(self, name: str, array: np.ndarray) -> None:
+        with self.writer.open(f"{name}.npy", 'w', force_zip64=True) as file:
+            np.lib.format.write_array(file, np.asarray(array), allow_pickle=False)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        self.flush()
+        if self.format == 'npz':
+            self._write_array('row_groups', np.array(self.row_groups, dtype=np.int64).reshape(-1, 5))
+            self._write_array('class_names', np.array(json.dumps(self.class_names)))
+        self.writer.close()
+        self.closed = True
+
+    def stats(self) -> dict:
+        return {
+            'format': self.format,
+            'rows': self.rows,
+            'buffered_rows': self.buffered_rows
+        }
+
+
+class ColumnarReader:
+    """ Reader of ColumnarWriter files that loads only the row groups needed
+
+    Row groups whose frame or tracker id range cannot match the query are
+    skipped without being read.
+    """
+    def __init__(self, path: str):
+        self.path = pathlib.Path(path)
+        if self.path.suffix == '.parquet':
+            if pq is None:
+                raise ImportError('pyarrow is required to read Parquet tracks files')
+            self.file = pq.ParquetFile(self.path)
+            metadata = self.file.schema_arrow.metadata or {}
+            self.class_names = self._class_names(metadata.get(b'class_names', b'{}'))
+            self.row_groups = self._parquet_row_groups()
+        else:
+            self.file = np.load(self.path, allow_pickle=False)
+            self.class_names = self._class_names(str(self.file['class_names']))
+            self.row_groups = self.file['row_groups']
+
+    @staticmethod
+    def _class_names(text) -> dict:
+        return {int(class_id): name for class_id, name in json.loads(text).items()}
+
+    def _parquet_row_groups(self) -> np.ndarray:
+        """ Rows and frame and tracker id ranges of each Parquet row group """
+        metadata = self.file.metadata
+        frame_column = self.file.schema_arrow.get_field_index('frame')
+        tracker_column = self.file.schema_arrow.get_field_index('tracker_id')
+        row_groups = []
+        for group in range(metadata.num_row_groups):
+            row_group = metadata.row_group(group)
+            frame_stats = row_group.column(frame_column).statistics
+            tracker_stats = row_group.column(tracker_column).statistics
+            row_groups.append([
+                row_group.num_rows,
+                frame_stats.min, frame_stats.max,
+                tracker_stats.min, tracker_stats.max
+            ])
+
+        return np.array(row_groups, dtype=np.int64).reshape(-1, 5)
+
+    def __len__(self) -> int:
+        return int(self.row_groups[:, 0].sum())
+
+    def select_row_groups(self, frame_range: tuple[int, int] = None, tracker_ids: list[int] = None) -> list[int]:
+        """ Row groups that may hold rows of the frame range and tracker ids """
+        selected = np.ones(len(self.row_groups), dtype=bool)
+        if frame_range is not None:
+            start, end = frame_range
+            selected &= (self.row_groups[:, 2] >= start) & (self.row_groups[:, 1] < end)
+        if tracker_ids is not None:
+            ids = np.asarray(tracker_ids)
+            in_range = (ids[None, :] >= self.row_groups[:, 3:4]) & (ids[None, :] <= self.row_groups[:, 4:5])
+            selected &= in_range.any(axis=1)
+
+        return np.flatnonzero(selected).tolist()
+
+    def _read_row_groups(self, groups: list[int]) -> dict[str, np.ndarray]:
+        if not groups:
+            return {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+
+        if isinstance(self.file, np.lib.npyio.NpzFile):
+            return {name: np.concatenate([self.file[f"{name}_{group}"] for group in groups]) for name in COLUMNS}
+
+        table = self.file.read_row_groups(groups)
+        return {name: table.column(name).to_numpy() for name in COLUMNS}
+
+    def read(self, frame_range: tuple[int, int] = None, tracker_ids: list[int] = None) -> dict[str, np.ndarray]:
+        """ Rows of a frame range and a set of tracker ids
+
+        Parameters
+        ----------
+            frame_range (tuple[int, int]): First frame and end frame, excluded.
+                None reads all frames
+            tracker_ids (list[int]): Tracker ids to read. None reads all tracks
+
+        Returns
+        -------
+            dict[str, np.ndarray]: Array per column, see COLUMNS
+        """
+        columns = self._read_row_groups(self.select_row_groups(frame_range, tracker_ids))
+
+        mask = np.ones(len(columns['frame']), dtype=bool)
+        if frame_range is not None:
+            mask &= (columns['frame'] >= frame_range[0]) & (columns['frame'] < frame_range[1])
+        if tracker_ids is not None:
+            mask &= np.isin(columns['tracker_id'], tracker_ids)
+        if mask.all():
+            return columns
+
+        return {name: array[mask] for name, array in columns.items()}
+
+    def close(self) -> None:
+        self.file.close()
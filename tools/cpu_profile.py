@@ -0,0 +1,64 @@
+from ultralytics import YOLO
+
+import os
+import cv2
+import torch
+import pathlib
+
+
+EXPORT_FORMATS = ('onnx', 'openvino')
+
+
+def default_device() -> str:
+    """ First GPU when CUDA is available, otherwise 'cpu' """
+    return '0' if torch.cuda.is_available() else 'cpu'
+
+
+def set_cpu_threads(threads: int = None) -> None:
+    """ Threads used by PyTorch and OpenCV. None keeps the library defaults """
+    if threads is None:
+        return
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+
+def inference_size(imgsz: int, half_resolution: bool = False) -> int:
+    """ Inference image size, halved to a multiple of 32 for half resolution """
+    if not half_resolution:
+        return imgsz
+    return max(32, imgsz // 2 // 32 * 32)
+
+
+def exported_weights(weights: str, export_format: str, imgsz: int) -> str:
+    """ Path of weights exported to export_format at a fixed image size
+
+    The export runs once and is kept next to the weights, named after the
+    image size, e.g. yolov8m_640.onnx or yolov8m_640_openvino_model/.
+    The YOLO wrapper loads both paths like .pt weights.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}', expected one of {EXPORT_FORMATS}")
+
+    weights = pathlib.Path(weights)
+    if export_format == 'onnx':
+        target = weights.with_name(f"{weights.stem}_{imgsz}.onnx")
+    else:
+        target = weights.with_name(f"{weights.stem}_{imgsz}_openvino_model")
+
+    if not target.exists():
+        exported = pathlib.Path(YOLO(str(weights)).export(format=export_format, imgsz=imgsz))
+        try:
+            os.replace(exported, target)
+        except OSError:
+            # Another process exported the same weights first, keep its export
+            if not target.exists():
+                raise
+
+    return str(target)
+
+
+def load_model(weights: str, export_format: str = None, imgsz: int = 640) -> YOLO:
+    """ YOLO model of the weights, or of their export to export_format """
+    if export_format is not None:
+        weights = exported_weights(weights, export_format, imgsz)
+    return YOLO(weights)
@@ -0,0 +1,283 @@
+import supervision as sv
+from supervision.detection.core import Detections
+
+import json
+import time
+import sqlite3
+import hashlib
+import pathlib
+import threading
+import zlib
+import numpy as np
+from collections import OrderedDict
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """ Hash of the file size and its first and last chunks """
+    path = pathlib.Path(path)
+    size = path.stat().st_size
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as file:
+        digest.update(file.read(chunk_size))
+        if size > chunk_size:
+            file.seek(max(size - chunk_size, chunk_size))
+            digest.update(file.read(chunk_size))
+
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """ Detections per frame, in a memory LRU backed by a SQLite file
+
+    Entries are keyed by a signature of the video and the model settings
+    plus the frame number. When the signature changes the memory layer is
+    cleared; rows stored under other signatures stay on disk for when the
+    settings come back.
+
+    Disk writes are committed every commit_rows frames or commit_seconds
+    seconds, and on close. Every source keeps the rows of its last
+    signatures_per_source signatures, and beyond disk_mb the rows of the
+    least recently used signatures are deleted. SQLite reuses the freed
+    pages, so the file stops growing at about disk_mb.
+    """
+    def __init__(
+        self,
+        path: str = 'cache/detections.sqlite',
+        max_items: int = 2048,
+        max_mb: int = 256,
+        disk_mb: int = 2048,
+        signatures_per_source: int = 4,
+        commit_rows: int = 64,
+        commit_seconds: float = 2.0
+    ):
+        """
+        Parameters
+        ----------
+            path (str): SQLite database file
+            max_items (int): Frames kept in memory, least recently used are evicted
+            max_mb (int): Memory cap of the frames kept in memory in megabytes, masks included
+            disk_mb (int): Size cap of the stored detections in megabytes
+            signatures_per_source (int): Model settings stored per source
+            commit_rows (int): Frames written before a commit
+            commit_seconds (float): Time since the last commit that triggers one
+        """
+        self.max_items = max_items
+        self.max_bytes = max_mb * 1024 * 1024
+        self.disk_bytes = disk_mb * 1024 * 1024
+        self.signatures_per_source = signatures_per_source
+        self.commit_rows = commit_rows
+        self.commit_seconds = commit_seconds
+
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.signature = None
+        self.lock = threading.Lock()
+
+        # Rows written since the last commit
+        self.uncommitted = 0
+        self.last_commit = time.perf_counter()
+
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS detections ('
+            'signature TEXT, frame INTEGER, xyxy BLOB, confidence BLOB, class_id BLOB, '
+            'mask BLOB, mask_shape TEXT, PRIMARY KEY (signature, frame))'
+        )
+        tracked = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'signatures'"
+        ).fetchone()
+        if tracked is None:
+            # Signatures stored before sizes were tracked, least recently used of all
+            self.connection.execute('CREATE TABLE signatures (signature TEXT PRIMARY KEY, last_used REAL, bytes INTEGER)')
+            self.connection.execute(
+                'INSERT INTO signatures SELECT signature, 0, '
+                'SUM(LENGTH(xyxy) + LENGTH(confidence) + LENGTH(class_id) + IFNULL(LENGTH(mask), 0)) '
+                'FROM detections GROUP BY signature'
+            )
+        self.connection.commit()
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.commits = 0
+        self.pruned_signatures = 0
+
+    @staticmethod
+    def make_signature(source_hash: str, weights: str, imgsz: int, conf: float, classes: list, region: str = None) -> str:
+        """ Key of the detections of a source with the given model settings
+
+        region is the signature of a RegionDetector, left out for whole-frame
+        detections so their signatures are unchanged
+        """
+        parts = [source_hash, weights, imgsz, conf, sorted(classes) if classes else None]
+        if region is not None:
+            parts.append(region)
+        return json.dumps(parts)
+
+    def configure(self, signature: str) -> None:
+        """ Select the signature of later lookups, clearing memory when it changes """
+        with self.lock:
+            self._select(signature)
+
+    def _select(self, signature: str) -> None:
+        if signature is None or signature == self.signature:
+            return
+        self.memory.clear()
+        self.memory_bytes = 0
+        self.signature = signature
+        self.connection.execute(
+            'INSERT INTO signatures VALUES (?, ?, 0) ON CONFLICT (signature) DO UPDATE SET last_used = excluded.last_used',
+            (signature, time.time())
+        )
+        self._prune()
+        self._commit()
+
+    def get(self, frame_number: int, signature: str = None) -> Detections:
+        """ Cached detections of a frame, or None
+
+        A signature selects it under the lock, so threads looking up with
+        different signatures do not read each other's entries
+        """
+        with self.lock:
+            self._select(signature)
+            if frame_number in self.memory:
+                self.memory.move_to_end(frame_number)
+                self.memory_hits += 1
+                return self.memory[frame_number]
+
+            row = self.connection.execute(
+                'SELECT xyxy, confidence, class_id, mask, mask_shape FROM detections WHERE signature = ? AND frame = ?',
+                (self.signature, frame_number)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            detections = self._decode(row)
+            self._remember(frame_number, detections)
+
+            return detections
+
+    def put(self, frame_number: int, detections: Detections, signature: str = None) -> None:
+        """ Store the detections of a frame, under signature if given
+
+        Detections of another signature than the selected one only go to disk
+        """
+        with self.lock:
+            signature = signature if signature is not None else self.signature
+            if signature == self.signature:
+                self._remember(frame_number, detections)
+
+            row = self._encode(detections)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (signature, frame_number) + row
+            )
+            self.connection.execute(
+                'INSERT INTO signatures VALUES (?, ?, ?) ON CONFLICT (signature) DO UPDATE SET bytes = bytes + excluded.bytes',
+                (signature, time.time(), sum(len(value) for value in row[:4] if value is not None))
+            )
+
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_rows or time.perf_counter() - self.last_commit >= self.commit_seconds:
+                self._commit()
+
+    def _commit(self) -> None:
+        self.connection.commit()
+        self.uncommitted = 0
+        self.last_commit = time.perf_counter()
+        self.commits += 1
+
+    def _prune(self) -> None:
+        """ Delete the rows of signatures over the per source and disk caps, never the selected one """
+        signatures = self.connection.execute(
+            'SELECT signature, bytes FROM signatures ORDER BY last_used DESC'
+        ).fetchall()
+
+        stale = []
+        kept = {}
+        total_bytes = 0
+        for signature, size in signatures:
+            try:
+                source = json.loads(signature)[0]
+            except (ValueError, TypeError, IndexError):
+                source = None
+            kept[source] = kept.get(source, 0) + 1
+            total_bytes += size or 0
+            if signature != self.signature and (kept[source] > self.signatures_per_source or total_bytes > self.disk_bytes):
+                stale.append(signature)
+                total_bytes -= size or 0
+
+        for signature in stale:
+            self.connection.execute('DELETE FROM detections WHERE signature = ?', (signature,))
+            self.connection.execute('DELETE FROM signatures WHERE signature = ?', (signature,))
+        self.pruned_signatures += len(stale)
+
+    def _remember(self, frame_number: int, detections: Detections) -> None:
+        previous = self.memory.pop(frame_number, None)
+        if previous is not None:
+            self.memory_bytes -= self._size(previous)
+        self.memory[frame_number] = detections
+        self.memory_bytes += self._size(detections)
+
+        while len(self.memory) > 1 and (len(self.memory) > self.max_items or self.memory_bytes > self.max_bytes):
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= self._size(evicted)
+
+    @staticmethod
+    def _size(detections: Detections) -> int:
+        """ Bytes of the arrays of detections """
+        arrays = (detections.xyxy, detections.confidence, detections.class_id, detections.mask)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    @staticmethod
+    def _encode(detections: Detections) -> tuple:
+        mask, mask_shape = None, None
+        if detections.mask is not None:
+            mask = zlib.compress(np.packbits(detections.mask).tobytes(), 1)
+            mask_shape = json.dumps(detections.mask.shape)
+        confidence = detections.confidence if detections.confidence is not None else np.ones(len(detections))
+
+        return (
+            detections.xyxy.astype(np.float64).tobytes(),
+            confidence.astype(np.float32).tobytes(),
+            detections.class_id.astype(np.int32).tobytes(),
+            mask,
+            mask_shape
+        )
+
+    @staticmethod
+    def _decode(row: tuple) -> Detections:
+        xyxy, confidence, class_id, mask, mask_shape = row
+        if mask is not None:
+            shape = json.loads(mask_shape)
+            bits = np.frombuffer(zlib.decompress(mask), dtype=np.uint8)
+            mask = np.unpackbits(bits, count=int(np.prod(shape))).reshape(shape).astype(bool)
+
+        return sv.Detections(
+            xyxy=np.frombuffer(xyxy, dtype=np.float64).reshape(-1, 4).copy(),
+            mask=mask,
+            confidence=np.frombuffer(confidence, dtype=np.float32).copy(),
+            class_id=np.frombuffer(class_id, dtype=np.int32).astype(int)
+        )
+
+    def close(self) -> None:
+        with self.lock:
+            self._commit()
+            self.connection.close()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups > 0 else 0.0,
+            'memory_items': len(self.memory),
+            'memory_mb': self.memory_bytes / 1024 / 1024,
+            'commits': self.commits,
+            'pruned_signatures': self.pruned_signatures
+        }
@@ -0,0 +1,131 @@
+import supervision as sv
+from supervision.detection.core import Detections
+
+import math
+import numpy as np
+from collections import deque
+
+
+class FrameSkipScheduler:
+    """ Chooses the frames to run detection on to keep playback real-time
+
+    Detection latency is tracked with an exponential moving average. When
+    it is longer than the display interval of target_fps, detection runs
+    only on every stride-th frame, with stride just large enough for the
+    detected frames to keep up with the display.
+    """
+    def __init__(self, target_fps: float, max_stride: int = 8, smoothing: float = 0.2, window: int = 120):
+        """
+        Parameters
+        ----------
+            target_fps (float): Display rate to keep up with, usually the video frame rate
+            max_stride (int): Largest number of frames per detection
+            smoothing (float): Weight of the newest latency in the moving average
+            window (int): Recent frames of the detection rate
+        """
+        self.target_fps = target_fps
+        self.max_stride = max_stride
+        self.smoothing = smoothing
+
+        self.latency = None
+        self.stride = 1
+        self.last_detected = None
+        self.last_frame = None
+        self.recent = deque(maxlen=window)
+
+        # Counters
+        self.frames = 0
+        self.detections = 0
+
+    @property
+    def interval_ms(self) -> float:
+        return 1000 / self.target_fps if self.target_fps > 0 else 0.0
+
+    def should_detect(self, frame_number: int) -> bool:
+        """ Whether frame_number runs detection. Frames after a jump always do """
+        jumped = self.last_frame is None or frame_number != self.last_frame + 1
+        detect = jumped or self.last_detected is None or frame_number - self.last_detected >= self.stride
+        if detect:
+            self.last_detected = frame_number
+            self.detections += 1
+        self.last_frame = frame_number
+        self.frames += 1
+        self.recent.append(detect)
+
+        return detect
+
+    def record(self, latency_ms: float) -> None:
+        """ Update the moving average with the latency of a detected frame and choose the stride """
+        if self.latency is None:
+            self.latency = latency_ms
+        else:
+            self.latency += self.smoothing * (latency_ms - self.latency)
+
+        if self.interval_ms > 0:
+            self.stride = min(self.max_stride, max(1, math.ceil(self.latency / self.interval_ms)))
+
+    def detection_rate(self) -> float:
+        """ Detected frames per second of video over the recent frames """
+        if not self.recent:
+            return 0.0
+        return self.target_fps * sum(self.recent) / len(self.recent)
+
+    def stats(self) -> dict:
+        return {
+            'stride': self.stride,
+            'latency_ms': self.latency if self.latency is not None else 0.0,
+            'detection_rate': self.detection_rate(),
+            'detected_frames': self.detections,
+            'frames': self.frames
+        }
+
+
+class MotionCarry:
+    """ Tracks carried forward between detected frames
+
+    Every track keeps its last box and a constant velocity measured between
+    its last two detected frames. Frames without detection get the boxes
+    moved by the velocity times the frames elapsed.
+    """
+    def __init__(self, max_age: int = 16):
+        """
+        Parameters
+        ----------
+            max_age (int): Frames a track is carried forward without detections
+        """
+        self.max_age = max_age
+
+        # tracker_id -> (frame_number, xyxy, velocity per frame, class_id, confidence)
+        self.tracks = {}
+
+    def clear(self) -> None:
+        self.tracks.clear()
+
+    def update(self, frame_number: int, tracks: Detections) -> None:
+        """ Store the tracks of a detected frame """
+        if len(tracks) == 0:
+            self.tracks = {}
+            return
+
+        updated = {}
+        confidences = tracks.confidence if tracks.confidence is not None else np.ones(len(tracks))
+        for xyxy, confidence, class_id, tracker_id in zip(tracks.xyxy, confidences, tracks.class_id, tracks.tracker_id):
+            previous = self.tracks.get(tracker_id)
+            velocity = np.zeros(4)
+            if previous is not None and frame_number > previous[0]:
+                velocity = (xyxy - previous[1]) / (frame_number - previous[0])
+            updated[tracker_id] = (frame_number, xyxy.astype(float), velocity, class_id, confidence)
+        self.tracks = updated
+
+    def predict(self, frame_number: int) -> Detections:
+        """ Tracks moved to frame_number """
+        alive = [track for track in self.tracks.items() if 0 <= frame_number - track[1][0] <= self.max_age]
+        if not alive:
+            return sv.Detections.empty()
+
+        return sv.Detections(
+            xyxy=np.array([xyxy + velocity * (frame_number - last) for _, (last, xyxy, velocity, _, _) in alive]),
+            confidence=np.array([track[4] for _, track in alive]),
+            class_id=np.array([track[3] for _, track in alive]),
+            tracker_id=np.array([tracker_id for tracker_id, _ in alive])
+        )
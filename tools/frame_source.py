@@ -0,0 +1,182 @@
+import cv2
+import time
+import numpy as np
+
+from tools.keyframe_index import KeyframeIndex
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+class FrameSource:
+    """ Video frame source aware of the decoder position
+
+    Frames are decoded with OpenCV. Once a keyframe index is set and PyAV is
+    installed, seeks go to the nearest keyframe with PyAV and decode forward
+    to the exact frame timestamp, and later reads continue from that decoder.
+    """
+    def __init__(self, source: str, max_grab: int = 8):
+        """
+        Parameters
+        ----------
+            source (str): Video file path
+            max_grab (int): Largest forward jump, in frames, decoded with
+                grab() instead of a seek
+        """
+        self.source = source
+        self.max_grab = max_grab
+        self.cap = cv2.VideoCapture(source)
+
+        # Index of the next frame returned by the decoder
+        self.position = 0
+
+        # Keyframes, set once built in the background
+        self.keyframe_index = None
+
+        # PyAV decoder used after keyframe seeks
+        self.container = None
+        self.decoder = None
+        self.pending_frame = None
+
+        # Counters
+        self.seek_count = 0
+        self.seek_time = 0.0
+        self.decode_count = 0
+
+    @property
+    def width(self) -> float:
+        return self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+
+    @property
+    def height(self) -> float:
+        return self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+
+    @property
+    def total_frames(self) -> int:
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    @property
+    def fps(self) -> float:
+        return float(self.cap.get(cv2.CAP_PROP_FPS))
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def release(self) -> None:
+        self.cap.release()
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+            self.decoder = None
+
+    def set_keyframe_index(self, keyframe_index: KeyframeIndex) -> None:
+        self.keyframe_index = keyframe_index
+
+    # --------
+    # Decoding
+    # --------
+    def _next_frame(self, convert: bool) -> tuple[bool, np.ndarray]:
+        if self.decoder is None:
+            if convert:
+                return self.cap.read()
+            return self.cap.grab(), None
+
+        if self.pending_frame is not None:
+            frame, self.pending_frame = self.pending_frame, None
+        else:
+            frame = next(self.decoder, None)
+            if frame is None:
+                return False, None
+
+        return True, frame.to_ndarray(format='bgr24') if convert else None
+
+    def skip(self, count: int) -> bool:
+        """ Decode and discard the next count frames """
+        for _ in range(count):
+            if not self._next_frame(convert=False)[0]:
+                return False
+            self.position += 1
+            self.decode_count += 1
+        return True
+
+    def seek(self, frame_number: int) -> None:
+        """ Move the decoder so the next read returns frame_number """
+        start = time.perf_counter()
+        if self.keyframe_index is None or av is None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            self.position = frame_number
+        else:
+            self._seek_keyframe(frame_number)
+        self.seek_count += 1
+        self.seek_time += time.perf_counter() - start
+
+    def _seek_keyframe(self, frame_number: int) -> None:
+        """ Jump to the keyframe before frame_number and decode forward to its timestamp """
+        if self.container is None:
+            self.container = av.open(self.source)
+            self.container.streams.video[0].thread_type = 'AUTO'
+        stream = self.container.streams.video[0]
+
+        self.pending_frame = None
+        self.position = frame_number
+        if frame_number >= len(self.keyframe_index.frame_pts):
+            self.decoder = iter(())
+            return
+
+        keyframe = self.keyframe_index.keyframe_before(frame_number)
+        self.container.seek(int(self.keyframe_index.frame_pts[keyframe]), stream=stream, backward=True, any_frame=False)
+        self.decoder = self.container.decode(stream)
+
+        target_pts = self.keyframe_index.frame_pts[frame_number]
+        for frame in self.decoder:
+            self.decode_count += 1
+            if frame.pts is not None and frame.pts >= target_pts:
+                self.pending_frame = frame
+                self.decode_count -= 1
+                break
+
+    def reachable(self, frame_number: int) -> bool:
+        """ Whether decoding forward reaches frame_number without a seek being faster """
+        gap = frame_number - self.position
+        if gap <= 0:
+            return False
+        if gap <= self.max_grab:
+            return True
+        if self.keyframe_index is not None:
+            return self.keyframe_index.keyframe_before(frame_number) <= self.position
+        return False
+
+    def read(self, frame_number: int = None) -> tuple[bool, np.ndarray]:
+        """ Read a frame, seeking only when it is not reachable by decoding forward
+
+        Parameters
+        ----------
+            frame_number (int): Frame index to read. None reads the next frame
+
+        Returns
+        -------
+            (bool, np.ndarray): Success flag and BGR image, as cv2.VideoCapture.read
+        """
+        if frame_number is not None and frame_number != self.position:
+            if self.reachable(frame_number):
+                if not self.skip(frame_number - self.position):
+                    return False, None
+            else:
+                self.seek(frame_number)
+
+        success, image = self._next_frame(convert=True)
+        if success:
+            self.position += 1
+            self.decode_count += 1
+
+        return success, image
+
+    def stats(self) -> dict:
+        return {
+            'seeks': self.seek_count,
+            'seek_ms': 1000 * self.seek_time / self.seek_count if self.seek_count > 0 else 0.0,
+            'decodes': self.decode_count,
+            'position': self.position
+        }
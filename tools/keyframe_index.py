@@ -0,0 +1,124 @@
+import pathlib
+import threading
+import numpy as np
+
+from tools.detection_cache import file_hash
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+class KeyframeIndex:
+    """ Keyframe numbers and byte offsets, and timestamps of every frame of a video """
+    def __init__(self, frames: np.ndarray, frame_pts: np.ndarray, offsets: np.ndarray, time_base: float):
+        """
+        Parameters
+        ----------
+            frames (np.ndarray): Keyframe numbers in presentation order
+            frame_pts (np.ndarray): Presentation timestamp of every frame, in time_base units
+            offsets (np.ndarray): Keyframe packet byte offsets, -1 when unknown
+            time_base (float): Seconds per timestamp unit
+        """
+        self.frames = frames
+        self.frame_pts = frame_pts
+        self.offsets = offsets
+        self.time_base = time_base
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def pts(self) -> np.ndarray:
+        """ Keyframe presentation timestamps """
+        return self.frame_pts[self.frames]
+
+    def keyframe_before(self, frame_number: int) -> int:
+        """ Nearest keyframe at or before frame_number """
+        index = np.searchsorted(self.frames, frame_number, side='right') - 1
+
+        return int(self.frames[max(index, 0)])
+
+    def keyframe_after(self, frame_number: int) -> int:
+        """ Nearest keyframe after frame_number, or None after the last keyframe """
+        index = np.searchsorted(self.frames, frame_number, side='right')
+
+        return int(self.frames[index]) if index < len(self.frames) else None
+
+    # -----------
+    # Persistence
+    # -----------
+    def save(self, path: str) -> None:
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, frames=self.frames, frame_pts=self.frame_pts, offsets=self.offsets, time_base=self.time_base)
+
+    @classmethod
+    def load(cls, path: str) -> 'KeyframeIndex':
+        with np.load(path) as data:
+            return cls(data['frames'], data['frame_pts'], data['offsets'], float(data['time_base']))
+
+    @classmethod
+    def build(cls, source: str) -> 'KeyframeIndex':
+        """ Read the keyframes of a video by demuxing its packets, without decoding
+
+        Requires PyAV. Returns None when it is not installed.
+        """
+        if av is None:
+            return None
+
+        pts, keyframes, offsets = [], [], []
+        with av.open(source) as container:
+            stream = container.streams.video[0]
+            time_base = float(stream.time_base)
+            for packet in container.demux(stream):
+                if packet.pts is None:
+                    continue
+                pts.append(packet.pts)
+                keyframes.append(packet.is_keyframe)
+                offsets.append(packet.pos if packet.pos is not None else -1)
+
+        # Packets come in decode order, frame numbers follow presentation order
+        pts = np.array(pts, dtype=np.int64)
+        order = np.argsort(pts, kind='stable')
+        frame_numbers = np.empty(len(pts), dtype=np.int64)
+        frame_numbers[order] = np.arange(len(pts))
+
+        keyframes = np.array(keyframes, dtype=bool)
+        key_order = np.argsort(frame_numbers[keyframes])
+        return cls(
+            frame_numbers[keyframes][key_order],
+            pts[order],
+            np.array(offsets, dtype=np.int64)[keyframes][key_order],
+            time_base
+        )
+
+    @classmethod
+    def load_or_build(cls, source: str, cache_dir: str = 'cache/keyframes') -> 'KeyframeIndex':
+        """ Keyframe index from the cache directory, built and saved when missing """
+        path = pathlib.Path(cache_dir) / f"{file_hash(source)}.npz"
+        if path.exists():
+            return cls.load(path)
+
+        index = cls.build(source)
+        if index is not None:
+            index.save(path)
+
+        return index
+
+
+def build_keyframe_index_async(source: str, callback: callable, cache_dir: str = 'cache/keyframes') -> threading.Thread:
+    """ Load or build the keyframe index in a background thread and pass it to callback """
+    def work():
+        try:
+            index = KeyframeIndex.load_or_build(source, cache_dir)
+        except Exception as error:
+            print(f"Keyframe index not available: {error}")
+            return
+        if index is not None:
+            callback(index)
+
+    thread = threading.Thread(target=work, daemon=True)
+    thread.start()
+
+    return thread
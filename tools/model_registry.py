@@ -0,0 +1,111 @@
+from ultralytics import YOLO
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from tools.cpu_profile import load_model
+
+
+def device_key(device) -> int | str:
+    """ Device as passed to YOLO: GPU index as int, 'cpu' as str """
+    device = str(device)
+    return int(device) if device.isdigit() else device
+
+
+class ModelRegistry:
+    """ Loaded YOLO models kept warm across sources
+
+    Models are loaded in a background thread on first use and keyed by
+    weights, device and export format, exports also by image size. A
+    warm-up inference runs before the model future is resolved, so the
+    first real frame does not pay for it. Beyond max_models
+    the least recently used model is dropped.
+    """
+    def __init__(self, max_models: int = 2, warmup_size: int = 640):
+        """
+        Parameters
+        ----------
+            max_models (int): Models kept loaded
+            warmup_size (int): Side of the black image of the warm-up inference
+        """
+        self.max_models = max_models
+        self.warmup_size = warmup_size
+
+        # (weights, device, export format, export image size) -> Future of YOLO model
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        # Counters
+        self.loads = 0
+        self.hits = 0
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+
+    def get(self, weights: str, device=0, export_format: str = None, imgsz: int = 640) -> Future:
+        """ Future of the model of weights on device, loading it if needed
+
+        Parameters
+        ----------
+            weights (str): Weights file path
+            device (int | str): Inference device, GPU index or 'cpu'
+            export_format (str): 'onnx' or 'openvino' to load an export of the
+                weights, made on first use. None loads the weights
+            imgsz (int): Image size of the export and of the warm-up inference.
+                Loaded weights are shared across image sizes
+
+        Returns
+        -------
+            Future: Resolves to the warmed-up YOLO model
+        """
+        # Exports are fixed to their image size, loaded weights run at any size
+        key = (str(weights), device_key(device), export_format, imgsz if export_format is not None else None)
+        with self.lock:
+            future = self.models.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self.models.move_to_end(key)
+                self.hits += 1
+                return future
+
+            future = self.executor.submit(self._load, str(weights), device_key(device), export_format, imgsz)
+            self.models[key] = future
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+
+        return future
+
+    def preload(self, weights: str, device=0, export_format: str = None, imgsz: int = 640) -> None:
+        """ Start loading a model before it is needed """
+        self.get(weights, device, export_format, imgsz)
+
+    def _load(self, weights: str, device, export_format: str, imgsz: int) -> YOLO:
+        start = time.perf_counter()
+        model = load_model(weights, export_format, imgsz)
+        self.load_time += time.perf_counter() - start
+        self.loads += 1
+
+        start = time.perf_counter()
+        model(
+            source=np.zeros((self.warmup_size, self.warmup_size, 3), dtype=np.uint8),
+            imgsz=imgsz,
+            device=device,
+            verbose=False
+        )
+        self.warmup_time += time.perf_counter() - start
+
+        return model
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            'loaded': [key for key, future in self.models.items() if future.done() and future.exception() is None],
+            'loads': self.loads,
+            'hits': self.hits,
+            'load_s': self.load_time,
+            'warmup_s': self.warmup_time
+        }
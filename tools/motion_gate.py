@@ -0,0 +1,180 @@
+from supervision.detection.core import Detections
+
+import cv2
+import time
+import numpy as np
+
+
+class MotionGate:
+    """ Reuses the last detections on frames without motion
+
+    Frames are downscaled to a small blurred grayscale image and compared
+    with the last frame that ran detection. Motion is measured locally, as
+    the largest share of changed pixels in a grid cell or around a box of
+    the reference detections, so a small object moving in a large frame is
+    not averaged away. When both stay below motion_threshold the frame is
+    static, its detections are those of the reference frame and the model
+    is not called. Comparing with the reference rather than the previous
+    frame keeps slow motion from passing the gate one small step at a time.
+
+    Only consecutive frames with unchanged model settings are gated, and
+    detection runs again after max_reuse gated frames.
+    """
+    def __init__(
+        self,
+        motion_threshold: float = 0.05,
+        pixel_threshold: int = 12,
+        width: int = 320,
+        cell_size: int = 8,
+        box_margin: float = 0.5,
+        max_reuse: int = 60
+    ):
+        """
+        Parameters
+        ----------
+            motion_threshold (float): Share of changed pixels of a cell or of a box
+                surrounding below which a frame is static
+            pixel_threshold (int): Grayscale difference of a changed pixel
+            width (int): Width of the downscaled frames compared
+            cell_size (int): Side of the grid cells in downscaled pixels
+            box_margin (float): Surrounding of the reference boxes checked for
+                motion, as a share of the box size on every side
+            max_reuse (int): Consecutive frames reusing the same detections
+        """
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.cell_size = cell_size
+        self.box_margin = box_margin
+        self.max_reuse = max_reuse
+
+        self.reference = None
+        self.image_width = None
+        self.boxes = np.empty((0, 4), dtype=int)
+        self.detections = None
+        self.settings = None
+        self.last_frame = None
+        self.reused = 0
+        self.latency = None
+
+        # Counters
+        self.frames = 0
+        self.gated = 0
+        self.gate_time = 0.0
+        self.saved_time = 0.0
+
+    def reset(self) -> None:
+        """ Forget the reference frame, the next frame runs detection """
+        self.reference = None
+        self.detections = None
+        self.last_frame = None
+
+    def small_frame(self, image: np.ndarray) -> np.ndarray:
+        """ Downscaled blurred grayscale frame
+
+        Large frames are first subsampled to twice the target size with a
+        nearest neighbour resize, so the area resize does not read every pixel
+        """
+        height, width = image.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        if width > 2 * self.width:
+            image = cv2.resize(image, (2 * size[0], 2 * size[1]), interpolation=cv2.INTER_NEAREST)
+        small = cv2.cvtColor(cv2.resize(image, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def small_boxes(self, detections: Detections, image_width: int, small_shape: tuple[int, int]) -> np.ndarray:
+        """ Boxes of detections grown by box_margin, in downscaled pixels clipped to the frame """
+        if detections is None or len(detections) == 0:
+            return np.empty((0, 4), dtype=int)
+
+        xyxy = detections.xyxy * (small_shape[1] / image_width)
+        margin = self.box_margin * (xyxy[:, 2:] - xyxy[:, :2]) + 1
+        grown = np.hstack([np.floor(xyxy[:, :2] - margin), np.ceil(xyxy[:, 2:] + margin)]).astype(int)
+        grown[:, 0::2] = np.clip(grown[:, 0::2], 0, small_shape[1])
+        grown[:, 1::2] = np.clip(grown[:, 1::2], 0, small_shape[0])
+
+        return grown
+
+    def motion(self, small: np.ndarray) -> float:
+        """ Largest share of changed pixels from the reference in a grid cell or a reference box surrounding """
+        if self.reference is None or self.reference.shape != small.shape:
+            return 1.0
+
+        changed = (cv2.absdiff(small, self.reference) > self.pixel_threshold).astype(np.float32)
+        height, width = changed.shape
+        cells = cv2.resize(changed, (max(1, width // self.cell_size), max(1, height // self.cell_size)), interpolation=cv2.INTER_AREA)
+        motion = float(cells.max())
+
+        boxes = self.boxes
+        if len(boxes) > 0:
+            integral = cv2.integral(changed)
+            x1, y1, x2, y2 = boxes.T
+            counts = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+            areas = np.maximum((x2 - x1) * (y2 - y1), 1)
+            motion = max(motion, float((counts / areas).max()))
+
+        return motion
+
+    def check(self, image: np.ndarray, frame_number: int, settings: str) -> tuple[Detections, np.ndarray]:
+        """ Detections of the reference frame when frame_number is static
+
+        Parameters
+        ----------
+            image (np.ndarray): BGR frame
+            frame_number (int): Frame number, only frames following the last one are gated
+            settings (str): Model settings, frames with other settings than the reference are not gated
+
+        Returns
+        -------
+            (Detections, np.ndarray): Reused detections, or None when the frame
+                needs detection, and the downscaled frame passed to update
+        """
+        start = time.perf_counter()
+        small = self.small_frame(image)
+        self.image_width = image.shape[1]
+        consecutive = self.last_frame is not None and frame_number == self.last_frame + 1
+        static = (
+            consecutive
+            and settings == self.settings
+            and self.reused < self.max_reuse
+            and self.motion(small) < self.motion_threshold
+        )
+        self.last_frame = frame_number
+        self.frames += 1
+        self.gate_time += time.perf_counter() - start
+
+        if not static:
+            return None, small
+
+        self.reused += 1
+        self.gated += 1
+        self.saved_time += self.latency or 0.0
+        return self.detections, small
+
+    def update(self, small: np.ndarray, settings: str, detections: Detections, latency: float = None) -> None:
+        """ Make a detected frame the reference
+
+        Parameters
+        ----------
+            small (np.ndarray): Downscaled frame returned by check
+            settings (str): Model settings of the detections
+            detections (Detections): Detections of the frame
+            latency (float): Model seconds of the frame, averaged into the time
+                saved per gated frame. None for detections that did not run the model
+        """
+        self.reference = small
+        self.settings = settings
+        self.detections = detections
+        self.boxes = self.small_boxes(detections, self.image_width, small.shape)
+        self.reused = 0
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + 0.2 * (latency - self.latency)
+
+    def stats(self) -> dict:
+        return {
+            'frames': self.frames,
+            'gated_frames': self.gated,
+            'gated_rate': self.gated / self.frames if self.frames > 0 else 0.0,
+            'gate_ms': 1000 * self.gate_time / self.frames if self.frames > 0 else 0.0,
+            'saved_s': self.saved_time
+        }
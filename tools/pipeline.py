@@ -0,0 +1,355 @@
+import supervision as sv
+from supervision.detection.core import Detections
+
+import copy
+import time
+import numpy as np
+from contextlib import nullcontext
+from concurrent.futures import Future
+
+from tools.detection_cache import DetectionCache
+from tools.annotators import AnnotationCache, box_annotations, mask_annotations, track_annotations
+from tools.frame_scheduler import FrameSkipScheduler, MotionCarry
+from tools.frame_source import FrameSource
+from tools.motion_gate import MotionGate
+from tools.region_inference import RegionDetector
+from tools.staged_pipeline import Stage
+from tools.stage_profiler import StageProfiler
+from tools.track_history import TrackHistory
+from tools.write_csv import ResultsWriter
+
+
+class FramePipeline:
+    """ Detection, tracking and annotation of video frames """
+    def __init__(self, model, tracker: sv.ByteTrack, classes: list = None, weights: str = None):
+        """
+        Parameters
+        ----------
+            model (YOLO | Future): Ultralytics detection model, or the future
+                of a model still loading, waited for on first inference
+            tracker (sv.ByteTrack): Object tracker
+            classes (list): Class ids passed to the model. None or an empty list detects all classes
+            weights (str): Model weights name, part of the detection cache key
+        """
+        self._model = model
+        self.tracker = tracker
+        self.classes = classes
+        self.weights = weights
+        self.class_names = getattr(model, 'names', {})
+
+        # Model settings
+        self.imgsz = 640
+        self.conf = 0.5
+        self.device = 0
+
+        # Detections of frames already processed
+        self.detection_cache = None
+        self.source_hash = None
+
+        # object tracks
+        self.track_history = TrackHistory(maxlen=64)
+        self.last_tracked_frame = None
+
+        # Detection on regions of interest or tiles instead of the whole frame
+        self.region = None
+
+        # Reuse of the last detections on frames without motion
+        self.motion_gate = None
+
+        # Playback frame skipping, set to detect only on some frames
+        self.scheduler = None
+        self.motion_carry = MotionCarry()
+
+        # Tracks file, written once per frame in increasing frame order
+        self.results_writer = None
+        self.last_written_frame = -1
+
+        # Rolling timings of the frame stages
+        self.profiler = None
+
+        # Colours, label sizes and label sprites
+        self.annotation_cache = AnnotationCache(sprites=True)
+
+        # Counters
+        self.inferred_frames = 0
+        self.inference_time = 0.0
+
+    @property
+    def model(self):
+        if isinstance(self._model, Future):
+            self._model = self._model.result()
+            self.class_names = getattr(self._model, 'names', self.class_names)
+        return self._model
+
+    def set_model(self, model, weights: str) -> None:
+        """ Replace the model, or the future of a model, used by the next inference """
+        self._model = model
+        self.weights = weights
+
+    def predict(self, source) -> list:
+        """ Run YOLOv8 inference on an image or a list of images """
+        model = self.model
+        start = time.perf_counter()
+        results = model(
+            source=source,
+            imgsz=self.imgsz,
+            conf=self.conf,
+            device=self.device,
+            agnostic_nms=True,
+            classes=self.classes or None,
+            retina_masks=True,
+            verbose=False
+        )
+        self.inference_time += time.perf_counter() - start
+        self.inferred_frames += len(source) if isinstance(source, list) else 1
+        self.class_names = results[0].names
+
+        return results
+
+    def use_cache(self, detection_cache: DetectionCache, source_hash: str) -> None:
+        """ Reuse detections of frames of the source already processed """
+        self.detection_cache = detection_cache
+        self.source_hash = source_hash
+
+    def use_motion_gate(self, motion_gate: MotionGate) -> None:
+        """ Skip inference on frames without motion. None detects every frame """
+        self.motion_gate = motion_gate
+
+    def use_profiler(self, profiler: StageProfiler) -> None:
+        """ Record the time of every frame stage. None disables profiling """
+        self.profiler = profiler
+
+    def profile(self, stage: str):
+        """ Context timing stage in the profiler, if any """
+        profiler = self.profiler
+        return profiler.measure(stage) if profiler is not None else nullcontext()
+
+    def use_region(self, region: RegionDetector) -> None:
+        """ Detect on regions of interest or tiles. None detects on the whole frame """
+        self.region = region
+
+    def detect_frame(self, image: np.ndarray) -> Detections:
+        """ Detections of a frame from the model, on the whole frame or on its regions """
+        region = self.region
+        if region is not None:
+            return region.detect(image, self.detect_batch)
+        return sv.Detections.from_ultralytics(self.predict(image)[0])
+
+    def settings_signature(self) -> str:
+        """ Source and model settings that change the detections of a frame """
+        region = self.region
+        return DetectionCache.make_signature(
+            self.source_hash, self.weights, self.imgsz, self.conf, self.classes,
+            region.signature() if region is not None else None
+        )
+
+    def detect(self, image: np.ndarray, frame_number: int = None) -> Detections:
+        """ Detections of a single frame, from the motion gate or the detection cache when available """
+        motion_gate = self.motion_gate
+        if motion_gate is None or frame_number is None:
+            return self.detect_cached(image, frame_number)
+
+        settings = self.settings_signature()
+        detections, small = motion_gate.check(image, frame_number, settings)
+        if detections is None:
+            inferred_frames, inference_time = self.inferred_frames, self.inference_time
+            detections = self.detect_cached(image, frame_number)
+            latency = self.inference_time - inference_time if self.inferred_frames > inferred_frames else None
+            motion_gate.update(small, settings, detections, latency)
+
+        return detections
+
+    def detect_cached(self, image: np.ndarray, frame_number: int = None) -> Detections:
+        """ Detections of a single frame, from the detection cache when available """
+        if self.detection_cache is None or frame_number is None:
+            return self.detect_frame(image)
+
+        signature = self.settings_signature()
+        detections = self.detection_cache.get(frame_number, signature)
+        if detections is None:
+            detections = self.detect_frame(image)
+            self.detection_cache.put(frame_number, detections, signature)
+        elif isinstance(self._model, Future) or not self.class_names:
+            # Cached detections skip the model, but their class ids are named by it
+            self.class_names = getattr(self.model, 'names', self.class_names)
+
+        return detections
+
+    def detect_batch(self, images: list[np.ndarray]) -> list[Detections]:
+        """ Detections of several frames in one batched inference call """
+        return [sv.Detections.from_ultralytics(results) for results in self.predict(images)]
+
+    def track(self, detections: Detections) -> Detections:
+        """ Update tracker with frame detections """
+        return self.tracker.update_with_detections(detections)
+
+    def restart_tracks(self, frame_number: int) -> None:
+        """ Reset the tracker and the trails when frame_number is not after the last tracked frame
+
+        Playback reads frames ahead of the display, so the tracker can be past
+        the frame playback starts from. Feeding it older frames would match
+        them with tracks of the future
+        """
+        if self.last_tracked_frame is None or frame_number > self.last_tracked_frame:
+            return
+
+        # New tracks go on numbering after the old ones, tracks files never reuse an id
+        external_id_counter = copy.copy(self.tracker.external_id_counter)
+        self.tracker.reset()
+        self.tracker.external_id_counter = external_id_counter
+        self.track_history.clear()
+        self.motion_carry.clear()
+        self.last_tracked_frame = None
+
+    def use_scheduler(self, scheduler: FrameSkipScheduler) -> None:
+        """ Detect only on the playback frames chosen by the scheduler, carrying tracks forward in between """
+        self.scheduler = scheduler
+        self.motion_carry.clear()
+
+    def use_results_writer(self, results_writer: ResultsWriter) -> None:
+        """ Write the tracks of frames processed past the last written frame """
+        self.results_writer = results_writer
+        self.last_written_frame = -1
+
+    def write_tracks(self, frame_number: int, tracks: Detections) -> None:
+        if self.results_writer is None or frame_number is None or frame_number <= self.last_written_frame:
+            return
+        self.results_writer.class_names = self.class_names
+        self.results_writer.write_tracks(frame_number, tracks)
+        self.last_written_frame = frame_number
+
+    def annotate(self, image: np.ndarray, detections: Detections, tracks: Detections) -> np.ndarray:
+        """ Draw boxes, labels, masks and tracks on a copy of the frame """
+        annotated_image = image.copy()
+
+        # Draw labels
+        labels = [f"{self.class_names[class_id]} - {tracker_id}" for class_id, tracker_id in zip(tracks.class_id, tracks.tracker_id)]
+
+        # Draw boxes
+        annotated_image = box_annotations(annotated_image, tracks, labels, self.annotation_cache)
+
+        # Draw masks
+        if detections.mask is not None:
+            with self.profile('masks'):
+                annotated_image = mask_annotations(annotated_image, detections)
+
+        # Draw tracks
+        annotated_image = track_annotations(annotated_image, tracks, self.track_history, 'centroid')
+
+        return annotated_image
+
+    def process(self, image: np.ndarray, frame_number: int = None) -> tuple[np.ndarray, Detections, Detections]:
+        """ Run the whole pipeline on a frame
+
+        Returns
+        -------
+            (np.ndarray, Detections, Detections): Annotated image, detections and tracks
+        """
+        with self.profile('infer'):
+            detections = self.detect(image, frame_number)
+        with self.profile('track'):
+            tracks = self.track(detections)
+            self.write_tracks(frame_number, tracks)
+            self.last_tracked_frame = frame_number
+        with self.profile('annotate'):
+            annotated_image = self.annotate(image, detections, tracks)
+
+        return annotated_image, detections, tracks
+
+    def ordered_detection(self) -> bool:
+        """ Whether detect needs frames in source order
+
+        The motion gate compares consecutive frames and the scheduler counts
+        the frames since the last detection, so both see frames one at a time
+        """
+        return self.motion_gate is not None or self.scheduler is not None
+
+    def stages(self, frame_source: FrameSource, render: callable = None, infer_workers: int = 1, render_workers: int = 1) -> list[Stage]:
+        """ Pipeline stages for a StagedPipeline fed with frame numbers
+
+        Decode, tracking and annotation keep source order because they change
+        decoder, tracker and trail state. Inference and rendering accept
+        several workers; inference workers share the model, so more than one
+        only helps with backends that release the GIL. Detection that depends
+        on frame order, see ordered_detection, always uses one infer worker.
+
+        With a profiler, every stage function is timed under the stage name.
+
+        With a scheduler, frames it skips are not detected and their tracks
+        are the last tracks moved by MotionCarry. Skipped frames are not
+        written to the results file.
+
+        Parameters
+        ----------
+            frame_source (FrameSource): Video frame source read by the decode stage
+            render (callable): Conversion applied to annotated images for display
+            infer_workers (int): Number of inference threads
+            render_workers (int): Number of render threads
+
+        Returns
+        -------
+            list[Stage]: decode, infer, track, annotate and render stages
+        """
+        if self.ordered_detection():
+            infer_workers = 1
+
+        def decode(frame_number):
+            success, image = frame_source.read(frame_number)
+            if not success:
+                raise EOFError(f"Frame {frame_number} could not be read")
+            return frame_number, image
+
+        def infer(item):
+            frame_number, image = item
+            if self.scheduler is None:
+                return frame_number, image, self.detect(image, frame_number)
+            if not self.scheduler.should_detect(frame_number):
+                return frame_number, image, None
+
+            start = time.perf_counter()
+            detections = self.detect(image, frame_number)
+            self.scheduler.record(1000 * (time.perf_counter() - start))
+            return frame_number, image, detections
+
+        def track(item):
+            frame_number, image, detections = item
+            if detections is None:
+                tracks = self.motion_carry.predict(frame_number)
+                return frame_number, image, tracks, tracks
+
+            tracks = self.track(detections)
+            self.write_tracks(frame_number, tracks)
+            self.last_tracked_frame = frame_number
+            if self.scheduler is not None:
+                self.motion_carry.update(frame_number, tracks)
+            return frame_number, image, detections, tracks
+
+        def annotate(item):
+            frame_number, image, detections, tracks = item
+            return frame_number, self.annotate(image, detections, tracks)
+
+        def render_image(item):
+            frame_number, annotated_image = item
+            return frame_number, render(annotated_image) if render is not None else annotated_image
+
+        def profiled(stage, function):
+            def timed(item):
+                with self.profile(stage):
+                    return function(item)
+            return timed
+
+        return [
+            Stage('decode', profiled('decode', decode), ordered=True),
+            Stage('infer', profiled('infer', infer), workers=infer_workers),
+            Stage('track', profiled('track', track), ordered=True),
+            Stage('annotate', profiled('annotate', annotate), ordered=True),
+            Stage('render', profiled('render', render_image), workers=render_workers)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            'inferred_frames': self.inferred_frames,
+            'inference_ms': 1000 * self.inference_time / self.inferred_frames if self.inferred_frames > 0 else 0.0,
+            'imgsz': self.imgsz,
+            'device': self.device
+        }
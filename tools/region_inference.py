@@ -0,0 +1,188 @@
+import supervision as sv
+from supervision.detection.core import Detections
+
+import cv2
+import json
+import time
+import numpy as np
+
+
+REGION_MODES = ('full', 'roi', 'tiles')
+
+
+def tile_windows(width: int, height: int, tile_size: int = 640, overlap: float = 0.2) -> np.ndarray:
+    """ Overlapping tiles covering the frame, shape (N, 4) as x1, y1, x2, y2
+
+    Tiles are tile_size squares, except when the frame is smaller, and the
+    last row and column are aligned to the frame border.
+    """
+    def starts(length: int) -> list[int]:
+        size = min(tile_size, length)
+        step = max(1, int(size * (1 - overlap)))
+        positions = list(range(0, length - size + 1, step))
+        if positions[-1] + size < length:
+            positions.append(length - size)
+        return positions
+
+    tile_width, tile_height = min(tile_size, width), min(tile_size, height)
+
+    return np.array([[x, y, x + tile_width, y + tile_height] for y in starts(height) for x in starts(width)], dtype=int)
+
+
+def polygon_windows(polygons: list[np.ndarray], width: int, height: int) -> np.ndarray:
+    """ Bounding rectangles of the polygons inside the frame, shape (N, 4) as x1, y1, x2, y2 """
+    windows = []
+    for polygon in polygons:
+        x, y, w, h = cv2.boundingRect(np.asarray(polygon, dtype=np.int32))
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(width, x + w), min(height, y + h)
+        if x2 > x1 and y2 > y1:
+            windows.append([x1, y1, x2, y2])
+
+    return np.array(windows, dtype=int).reshape(-1, 4)
+
+
+def inside_polygons(points: np.ndarray, polygons: list[np.ndarray]) -> np.ndarray:
+    """ Whether each point (x, y) is inside any polygon, shape (N,) """
+    inside = np.zeros(len(points), dtype=bool)
+    for polygon in polygons:
+        contour = np.asarray(polygon, dtype=np.float32).reshape(-1, 1, 2)
+        inside |= np.array([cv2.pointPolygonTest(contour, (float(x), float(y)), False) >= 0 for x, y in points], dtype=bool)
+
+    return inside
+
+
+def merge_overlaps(detections: Detections, threshold: float = 0.5) -> Detections:
+    """ Class-aware greedy non-maximum merging by intersection over the smaller box
+
+    Boxes cut at a tile border are parts of a box found in the neighbouring
+    tile. Their IoU with it is low, but most of their area is inside it, so
+    overlaps are measured against the smaller box. As in SAHI, the most
+    confident box grows to the union of the boxes it absorbs.
+    """
+    xyxy = detections.xyxy.copy()
+    areas = np.prod(xyxy[:, 2:] - xyxy[:, :2], axis=1)
+    keep = np.ones(len(detections), dtype=bool)
+    for i in np.argsort(-detections.confidence, kind='stable'):
+        if not keep[i]:
+            continue
+        while True:
+            others = np.flatnonzero(keep & (detections.class_id == detections.class_id[i]))
+            others = others[others != i]
+            if others.size == 0:
+                break
+            top_left = np.maximum(xyxy[i, :2], xyxy[others, :2])
+            bottom_right = np.minimum(xyxy[i, 2:], xyxy[others, 2:])
+            intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
+            smaller = np.maximum(np.minimum(np.prod(xyxy[i, 2:] - xyxy[i, :2]), areas[others]), 1e-9)
+            absorbed = others[intersection / smaller >= threshold]
+            if absorbed.size == 0:
+                break
+            xyxy[i, :2] = np.minimum(xyxy[i, :2], xyxy[absorbed, :2].min(axis=0))
+            xyxy[i, 2:] = np.maximum(xyxy[i, 2:], xyxy[absorbed, 2:].max(axis=0))
+            keep[absorbed] = False
+
+    merged = detections[keep]
+    merged.xyxy = xyxy[keep]
+
+    return merged
+
+
+class RegionDetector:
+    """ Detection on parts of the frame
+
+    In 'roi' mode only the bounding rectangles of the polygons are sent to
+    the model, and detections with their centre outside every polygon are
+    dropped. In 'tiles' mode the frame is cut into overlapping tiles, like
+    SAHI. Crops are inferred in batches, their boxes moved back to frame
+    coordinates and merged with merge_overlaps. Crop masks are dropped.
+    """
+    def __init__(
+        self,
+        mode: str = 'tiles',
+        polygons: list[np.ndarray] = None,
+        tile_size: int = 640,
+        tile_overlap: float = 0.2,
+        overlap_threshold: float = 0.5,
+        batch_size: int = 16
+    ):
+        """
+        Parameters
+        ----------
+            mode (str): Region mode
+                Options: 'roi' = polygons, 'tiles' = overlapping tiles
+            polygons (list[np.ndarray]): Polygons of the 'roi' mode in frame pixels, shape (M, 2) each
+            tile_size (int): Tile side in frame pixels. Equal to the inference
+                size, tiles are inferred at full resolution
+            tile_overlap (float): Fraction of a tile shared with its neighbour
+            overlap_threshold (float): Share of the smaller box above which
+                overlapping boxes of a class are merged
+            batch_size (int): Crops per inference call
+        """
+        self.mode = mode
+        self.polygons = polygons if polygons is not None else []
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.overlap_threshold = overlap_threshold
+        self.batch_size = batch_size
+
+        # Counters
+        self.frames = 0
+        self.windows = 0
+        self.detect_time = 0.0
+
+    def signature(self) -> str:
+        """ Settings that change the detections, part of the detection cache key """
+        if self.mode == 'roi':
+            return json.dumps(['roi', [np.asarray(polygon).astype(int).tolist() for polygon in self.polygons]])
+        return json.dumps(['tiles', self.tile_size, self.tile_overlap, self.overlap_threshold])
+
+    def windows_of(self, width: int, height: int) -> np.ndarray:
+        if self.mode == 'roi':
+            return polygon_windows(self.polygons, width, height)
+        return tile_windows(width, height, self.tile_size, self.tile_overlap)
+
+    def detect(self, image: np.ndarray, detect_batch: callable) -> Detections:
+        """ Detections of the frame regions
+
+        Parameters
+        ----------
+            image (np.ndarray): BGR frame
+            detect_batch (callable): Detections of a list of images, as FramePipeline.detect_batch
+        """
+        start = time.perf_counter()
+        height, width = image.shape[:2]
+        windows = self.windows_of(width, height)
+
+        merged = []
+        for batch_start in range(0, len(windows), self.batch_size):
+            batch = windows[batch_start:batch_start + self.batch_size]
+            crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in batch]
+            for (x1, y1, _, _), detections in zip(batch, detect_batch(crops)):
+                if len(detections) == 0:
+                    continue
+                detections.xyxy = detections.xyxy + np.array([x1, y1, x1, y1], dtype=detections.xyxy.dtype)
+                detections.mask = None
+                merged.append(detections)
+
+        detections = sv.Detections.merge(merged) if merged else sv.Detections.empty()
+        if len(detections) > 0:
+            if len(windows) > 1:
+                detections = merge_overlaps(detections, self.overlap_threshold)
+            if self.mode == 'roi':
+                centres = (detections.xyxy[:, :2] + detections.xyxy[:, 2:]) / 2
+                detections = detections[inside_polygons(centres, self.polygons)]
+
+        self.frames += 1
+        self.windows += len(windows)
+        self.detect_time += time.perf_counter() - start
+
+        return detections
+
+    def stats(self) -> dict:
+        return {
+            'mode': self.mode,
+            'frames': self.frames,
+            'windows_per_frame': self.windows / self.frames if self.frames > 0 else 0.0,
+            'ms_per_frame': 1000 * self.detect_time / self.frames if self.frames > 0 else 0.0
+        }
@@ -0,0 +1,135 @@
+import supervision as sv
+from supervision.detection.core import Detections
+
+import csv
+import pathlib
+import numpy as np
+
+from tools.annotators import track_anchors
+from tools.columnar_results import COLUMNAR_SUFFIXES, ColumnarReader
+from tools.pipeline import FramePipeline
+
+
+class TrackIndex:
+    """ Saved tracks indexed by frame
+
+    Rows are sorted by frame once, so the tracks of a frame are a slice of
+    each column found with a binary search.
+    """
+    def __init__(self, columns: dict[str, np.ndarray], class_names: dict):
+        """
+        Parameters
+        ----------
+            columns (dict[str, np.ndarray]): Arrays 'frame', 'tracker_id',
+                'class_id', 'x', 'y', 'w', 'h' and optionally 'confidence'
+            class_names (dict): Class names by class id
+        """
+        order = np.argsort(columns['frame'], kind='stable')
+        self.frames = columns['frame'][order]
+        self.tracker_id = columns['tracker_id'][order].astype(int)
+        self.class_id = columns['class_id'][order].astype(int)
+        x, y = columns['x'][order], columns['y'][order]
+        self.xyxy = np.stack([x, y, x + columns['w'][order], y + columns['h'][order]], axis=1).astype(np.float32)
+        confidence = columns.get('confidence')
+        self.confidence = confidence[order].astype(np.float32) if confidence is not None else np.ones(len(order), np.float32)
+        self.class_names = class_names
+
+    @classmethod
+    def load(cls, path: str, class_names: dict = None) -> 'TrackIndex':
+        """ Index of a tracks file written by ResultsWriter or ColumnarWriter
+
+        Parameters
+        ----------
+            path (str): Tracks file, CSV, .parquet or .npz
+            class_names (dict): Class names by class id, used to give CSV class
+                names their ids. Names not found get new ids
+        """
+        if pathlib.Path(path).suffix in COLUMNAR_SUFFIXES:
+            reader = ColumnarReader(path)
+            columns = reader.read()
+            reader.close()
+            return cls(columns, reader.class_names)
+
+        with open(path, 'r', newline='') as csv_file:
+            rows = list(csv.reader(csv_file))
+        if not rows:
+            return cls({name: np.empty(0, int) for name in ('frame', 'tracker_id', 'class_id', 'x', 'y', 'w', 'h')}, dict(class_names or {}))
+
+        frame, tracker_id, names, x, y, w, h, _ = zip(*rows)
+        class_ids = {name: class_id for class_id, name in (class_names or {}).items()}
+        for name in dict.fromkeys(names):
+            if name not in class_ids:
+                class_ids[name] = max(class_ids.values(), default=-1) + 1
+        columns = {
+            'frame': np.array(frame, dtype=int),
+            'tracker_id': np.array(tracker_id, dtype=int),
+            'class_id': np.array([class_ids[name] for name in names]),
+            'x': np.array(x, dtype=int),
+            'y': np.array(y, dtype=int),
+            'w': np.array(w, dtype=int),
+            'h': np.array(h, dtype=int)
+        }
+
+        return cls(columns, {class_id: name for name, class_id in class_ids.items()})
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def tracks(self, frame_number: int, classes: list = None) -> Detections:
+        """ Tracks of a frame, only of the given class ids. None or an empty list keeps all classes """
+        start, end = np.searchsorted(self.frames, [frame_number, frame_number + 1])
+        tracks = sv.Detections(
+            xyxy=self.xyxy[start:end].reshape(-1, 4),
+            confidence=self.confidence[start:end],
+            class_id=self.class_id[start:end],
+            tracker_id=self.tracker_id[start:end]
+        )
+        if classes:
+            tracks = tracks[np.isin(tracks.class_id, classes)]
+
+        return tracks
+
+
+class ReplayPipeline(FramePipeline):
+    """ Pipeline that draws saved tracks instead of running the model
+
+    detect returns the tracks of the frame from a TrackIndex and track
+    passes them through, so VideoWorker plays a replay like a live run.
+    After a jump, trails are rebuilt from the tracks of the previous frames.
+    """
+    def __init__(self, track_index: TrackIndex):
+        super().__init__(None, None)
+        self.track_index = track_index
+        self.class_names = track_index.class_names
+        self.last_frame = None
+
+    def detect(self, image: np.ndarray, frame_number: int = None) -> Detections:
+        if frame_number is None:
+            return sv.Detections.empty()
+
+        if self.last_frame is None or frame_number != self.last_frame + 1:
+            self._rebuild_trails(frame_number)
+        self.last_frame = frame_number
+
+        return self.track_index.tracks(frame_number, self.classes)
+
+    def detect_batch(self, images: list[np.ndarray]) -> list[Detections]:
+        raise TypeError('ReplayPipeline reads tracks by frame number and has no model for batches of images, use detect(image, frame_number)')
+
+    def track(self, detections: Detections) -> Detections:
+        return detections
+
+    def ordered_detection(self) -> bool:
+        """ Trails are rebuilt when frames do not follow the last one """
+        return True
+
+    def restart_tracks(self, frame_number: int) -> None:
+        """ Saved tracks need no tracker, detect rebuilds the trails after a jump """
+        return
+
+    def _rebuild_trails(self, frame_number: int) -> None:
+        """ Fill the track history with the frames before frame_number """
+        self.track_history.clear()
+        for previous_frame in range(max(0, frame_number - self.track_history.maxlen), frame_number):
+            tracks = self.track_index.tracks(previous_frame, self.classes)
+            self.track_history.update(tracks.tracker_id, track_anchors(tracks.xyxy, 'centroid'), previous_frame)
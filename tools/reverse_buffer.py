@@ -0,0 +1,122 @@
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.frame_source import FrameSource
+from tools.keyframe_index import KeyframeIndex
+
+
+class ReverseFrameBuffer:
+    """ Decoded frames for reverse playback
+
+    A segment of frames ending at the requested frame is decoded forward,
+    from its keyframe when a keyframe index is set, and kept in memory to be
+    returned in reverse order. While it is played, the previous segment is
+    decoded in a background thread. Decoded frames never exceed max_mb.
+    """
+    def __init__(self, source: str, max_mb: int = 512, segment_frames: int = 32):
+        """
+        Parameters
+        ----------
+            source (str): Video file path, opened with a decoder of its own
+            max_mb (int): Memory cap of buffered frames in megabytes
+            segment_frames (int): Frames per segment when there is no keyframe index
+        """
+        self.frame_source = FrameSource(source)
+        self.segment_frames = segment_frames
+
+        frame_bytes = max(1, int(self.frame_source.width * self.frame_source.height * 3))
+        self.max_frames = max(2, max_mb * 1024 * 1024 // frame_bytes)
+
+        self.frames = {}
+        self.lock = threading.Lock()
+        self.decode_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.prefetch = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.decoded_segments = 0
+
+    def set_keyframe_index(self, keyframe_index: KeyframeIndex) -> None:
+        self.frame_source.set_keyframe_index(keyframe_index)
+
+    def segment(self, frame_number: int) -> tuple[int, int]:
+        """ First and last frame of the segment ending at frame_number """
+        if self.frame_source.keyframe_index is not None:
+            start = self.frame_source.keyframe_index.keyframe_before(frame_number)
+        else:
+            start = frame_number - self.segment_frames + 1
+        start = max(start, frame_number - self.max_frames // 2 + 1, 0)
+
+        return start, frame_number
+
+    def decode_segment(self, start: int, end: int) -> None:
+        with self.decode_lock:
+            decoded = []
+            for frame_number in range(start, end + 1):
+                success, image = self.frame_source.read(frame_number)
+                if not success:
+                    break
+                decoded.append((frame_number, image))
+            self.decoded_segments += 1
+
+        with self.lock:
+            self.frames.update(decoded)
+            # Lowest frames are the last ones played back
+            while len(self.frames) > self.max_frames:
+                del self.frames[min(self.frames)]
+
+    def read(self, frame_number: int) -> tuple[bool, np.ndarray]:
+        """ Frame for reverse playback, as cv2.VideoCapture.read """
+        with self.lock:
+            image = self.frames.pop(frame_number, None)
+
+        if image is None and self.prefetch is not None:
+            self.prefetch.result()
+            with self.lock:
+                image = self.frames.pop(frame_number, None)
+
+        if image is None:
+            self.misses += 1
+            with self.lock:
+                self.frames.clear()
+            self.decode_segment(*self.segment(frame_number))
+            with self.lock:
+                image = self.frames.pop(frame_number, None)
+        else:
+            self.hits += 1
+
+        self._prefetch_previous(frame_number)
+
+        return image is not None, image
+
+    def _prefetch_previous(self, frame_number: int) -> None:
+        """ Decode the segment before the buffered frames if it fits in memory """
+        if self.prefetch is not None and not self.prefetch.done():
+            return
+
+        with self.lock:
+            lowest = min(self.frames) if self.frames else frame_number
+            buffered = len(self.frames)
+        if lowest <= 0:
+            return
+
+        start, end = self.segment(lowest - 1)
+        if buffered + end - start + 1 <= self.max_frames:
+            self.prefetch = self.executor.submit(self.decode_segment, start, end)
+
+    def release(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.frame_source.release()
+        self.frames.clear()
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'decoded_segments': self.decoded_segments,
+            'buffered_frames': len(self.frames),
+            'max_frames': self.max_frames
+        }
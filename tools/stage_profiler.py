@@ -0,0 +1,106 @@
+import cv2
+import json
+import time
+import threading
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+
+
+class StageProfiler:
+    """ Rolling timings of the frame stages
+
+    Every stage keeps its last window durations, summarised as p50, p95
+    and max. Stages run in different threads, so recording is locked.
+    Stages nested in others, like masks inside annotate, are also part of
+    the outer stage time.
+    """
+    def __init__(self, window: int = 300):
+        """
+        Parameters
+        ----------
+            window (int): Recent durations kept per stage
+        """
+        self.window = window
+
+        # stage name -> deque of seconds, in first recorded order
+        self.timings = {}
+        self.lock = threading.Lock()
+
+        # Counters
+        self.start_time = time.perf_counter()
+        self.totals = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            timings = self.timings.get(stage)
+            if timings is None:
+                timings = self.timings[stage] = deque(maxlen=self.window)
+                self.totals[stage] = [0, 0.0]
+            timings.append(seconds)
+            self.totals[stage][0] += 1
+            self.totals[stage][1] += seconds
+
+    @contextmanager
+    def measure(self, stage: str):
+        """ Record the duration of the with block as stage """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.timings.clear()
+            self.totals.clear()
+            self.start_time = time.perf_counter()
+
+    def summary(self) -> dict:
+        """ Milliseconds p50, p95 and max of the recent durations of every stage """
+        with self.lock:
+            timings = {stage: np.array(durations) for stage, durations in self.timings.items()}
+
+        summary = {}
+        for stage, durations in timings.items():
+            if len(durations) == 0:
+                continue
+            p50, p95 = 1000 * np.percentile(durations, [50, 95])
+            summary[stage] = {'p50_ms': float(p50), 'p95_ms': float(p95), 'max_ms': float(1000 * durations.max())}
+
+        return summary
+
+    def draw_overlay(self, image: np.ndarray, origin: tuple[int, int] = (16, 16)) -> np.ndarray:
+        """ Write the stage summary on the top left corner of a BGR image, in place """
+        rows = [('ms', 'p50', 'p95', 'max')]
+        rows += [
+            (stage, f"{values['p50_ms']:.1f}", f"{values['p95_ms']:.1f}", f"{values['max_ms']:.1f}")
+            for stage, values in self.summary().items()
+        ]
+
+        # Column positions at 1080 lines, scaled to the image
+        scale = max(0.5, image.shape[0] / 1080)
+        line_height = int(28 * scale)
+        columns = [int(offset * scale) for offset in (8, 120, 200, 280)]
+        x, y = origin
+        image[y:y + line_height * len(rows) + line_height // 2, x:x + int(360 * scale)] //= 3
+        for index, row in enumerate(rows, start=1):
+            for column, text in zip(columns, row):
+                cv2.putText(image, text, (x + column, y + index * line_height), cv2.FONT_HERSHEY_SIMPLEX, 0.6 * scale, (255, 255, 255), 1, cv2.LINE_AA)
+
+        return image
+
+    def export(self, path: str) -> None:
+        """ Save the summary and the session totals of every stage as JSON """
+        with self.lock:
+            totals = {stage: {'count': count, 'mean_ms': 1000 * seconds / count} for stage, (count, seconds) in self.totals.items()}
+        report = {
+            'window': self.window,
+            'seconds': time.perf_counter() - self.start_time,
+            'stages': {stage: {**totals.get(stage, {}), **values} for stage, values in self.summary().items()}
+        }
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    def stats(self) -> dict:
+        return self.summary()
@@ -0,0 +1,194 @@
+import threading
+import queue
+import heapq
+import time
+
+
+_END = object()
+
+
+class Stage:
+    """ Pipeline stage """
+    def __init__(self, name: str, function: callable, workers: int = 1, ordered: bool = False):
+        """
+        Parameters
+        ----------
+            name (str): Stage name, used in statistics
+            function (callable): Function applied to each item
+            workers (int): Number of worker threads. Ordered stages use one worker
+            ordered (bool): Items are processed strictly in source order
+        """
+        self.name = name
+        self.function = function
+        self.workers = 1 if ordered else max(1, workers)
+        self.ordered = ordered
+
+        # Statistics
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.busy_time = 0.0
+
+    def record(self, elapsed: float) -> None:
+        with self.lock:
+            self.processed += 1
+            self.busy_time += elapsed
+
+
+class StagedPipeline:
+    """ Multi-stage executor with bounded queues between stages
+
+    Every stage runs in its own worker threads and items move between stages
+    through bounded queues, so a slow stage blocks the ones before it instead
+    of buffering without limit. Ordered stages reorder their input by source
+    index before processing and results are yielded in source order.
+    """
+    def __init__(self, stages: list[Stage], queue_size: int = 4):
+        """
+        Parameters
+        ----------
+            stages (list[Stage]): Stages in execution order
+            queue_size (int): Capacity of each queue between stages
+        """
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self.stop_event = threading.Event()
+        self.feed_stop = threading.Event()
+        self.threads = []
+        self.error = None
+        self.start_time = None
+
+        self.remaining_workers = [stage.workers for stage in stages]
+        self.workers_lock = threading.Lock()
+
+    # -------
+    # Control
+    # -------
+    def start(self, source) -> None:
+        """ Start feeding items from an iterable through the stages """
+        self.start_time = time.perf_counter()
+
+        feeder = threading.Thread(target=self._feed, args=(source,), daemon=True)
+        self.threads.append(feeder)
+
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                worker = threading.Thread(target=self._work, args=(index,), daemon=True)
+                self.threads.append(worker)
+
+        for thread in self.threads:
+            thread.start()
+
+    def finish(self) -> None:
+        """ Stop feeding items from the source, items already fed still go through every stage """
+        self.feed_stop.set()
+
+    def stop(self) -> None:
+        """ Stop all stages and discard items in flight """
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+    def results(self):
+        """ Yield stage outputs in source order until the source is exhausted """
+        pending = []
+        next_index = 0
+        while True:
+            item = self._get(self.queues[-1])
+            if item is None or item is _END:
+                break
+            heapq.heappush(pending, item)
+            while pending and pending[0][0] == next_index:
+                yield heapq.heappop(pending)[1]
+                next_index += 1
+
+        if self.error is not None:
+            raise self.error
+
+    # -------
+    # Workers
+    # -------
+    def _get(self, source_queue: queue.Queue):
+        while not self.stop_event.is_set():
+            try:
+                return source_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+        return None
+
+    def _put(self, target_queue: queue.Queue, item) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                target_queue.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, source) -> None:
+        for index, item in enumerate(source):
+            if self.feed_stop.is_set():
+                break
+            if not self._put(self.queues[0], (index, item)):
+                return
+        self._put(self.queues[0], _END)
+
+    def _work(self, stage_index: int) -> None:
+        stage = self.stages[stage_index]
+        input_queue = self.queues[stage_index]
+        output_queue = self.queues[stage_index + 1]
+
+        pending = []
+        next_index = 0
+        while True:
+            item = self._get(input_queue)
+            if item is None:
+                return
+            if item is _END:
+                # Let sibling workers see the end marker, the last one forwards it
+                with self.workers_lock:
+                    self.remaining_workers[stage_index] -= 1
+                    last_worker = self.remaining_workers[stage_index] == 0
+                self._put(output_queue if last_worker else input_queue, _END)
+                return
+
+            if stage.ordered:
+                heapq.heappush(pending, item)
+                ready = []
+                while pending and pending[0][0] == next_index:
+                    ready.append(heapq.heappop(pending))
+                    next_index += 1
+            else:
+                ready = [item]
+
+            for index, payload in ready:
+                start = time.perf_counter()
+                try:
+                    result = stage.function(payload)
+                except Exception as error:
+                    self.error = error
+                    self._put(self.queues[-1], _END)
+                    self.stop_event.set()
+                    return
+                stage.record(time.perf_counter() - start)
+
+                if not self._put(output_queue, (index, result)):
+                    return
+
+    # ----------
+    # Statistics
+    # ----------
+    def stats(self) -> dict:
+        """ Throughput, mean time and input queue depth of every stage """
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+        stage_stats = {}
+        for stage, input_queue in zip(self.stages, self.queues):
+            stage_stats[stage.name] = {
+                'workers': stage.workers,
+                'processed': stage.processed,
+                'throughput': stage.processed / elapsed if elapsed > 0 else 0.0,
+                'mean_ms': 1000 * stage.busy_time / stage.processed if stage.processed > 0 else 0.0,
+                'queue_depth': input_queue.qsize()
+            }
+        stage_stats['output'] = {'queue_depth': self.queues[-1].qsize()}
+
+        return stage_stats
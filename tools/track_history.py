@@ -0,0 +1,98 @@
+import numpy as np
+from collections import OrderedDict
+
+
+class TrackHistory:
+    """ Bounded store of recent positions of each track
+
+    Every track keeps its last maxlen points in a preallocated NumPy ring
+    buffer. Tracks not updated for max_age frames are evicted, and when the
+    store goes over max_bytes the least recently seen tracks are evicted.
+    """
+    def __init__(self, maxlen: int = 64, max_age: int = 30, max_bytes: int = 16 * 1024 * 1024):
+        """
+        Parameters
+        ----------
+            maxlen (int): Points kept per track
+            max_age (int): Frames without updates before a track is evicted
+            max_bytes (int): Memory cap of all point buffers
+        """
+        self.maxlen = maxlen
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+        # tracker_id -> [points buffer, next write index, point count, last frame]
+        self.tracks = OrderedDict()
+        self.frame_number = 0
+
+        # Counters
+        self.evicted_tracks = 0
+
+    @property
+    def track_bytes(self) -> int:
+        return self.maxlen * 2 * np.dtype(np.int32).itemsize
+
+    def __contains__(self, tracker_id: int) -> bool:
+        return tracker_id in self.tracks
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def update(self, tracker_ids: np.ndarray, points: np.ndarray, frame_number: int = None) -> None:
+        """ Add the current position of each track and evict stale tracks
+
+        Parameters
+        ----------
+            tracker_ids (np.ndarray): Tracker ids, shape (N,)
+            points (np.ndarray): Positions (x, y) of the tracks, shape (N, 2)
+            frame_number (int): Current frame. None advances one frame
+        """
+        self.frame_number = self.frame_number + 1 if frame_number is None else frame_number
+
+        for tracker_id, point in zip(tracker_ids, points):
+            track = self.tracks.get(tracker_id)
+            if track is None:
+                track = [np.empty((self.maxlen, 2), dtype=np.int32), 0, 0, self.frame_number]
+                self.tracks[tracker_id] = track
+            else:
+                self.tracks.move_to_end(tracker_id)
+
+            buffer, index, _, _ = track
+            buffer[index] = point
+            track[1] = (index + 1) % self.maxlen
+            track[2] = min(track[2] + 1, self.maxlen)
+            track[3] = self.frame_number
+
+        self.evict()
+
+    def evict(self) -> None:
+        """ Remove tracks older than max_age and the oldest tracks over max_bytes """
+        while self.tracks:
+            tracker_id, track = next(iter(self.tracks.items()))
+            too_old = self.frame_number - track[3] > self.max_age
+            too_big = len(self.tracks) * self.track_bytes > self.max_bytes
+            if not (too_old or too_big):
+                break
+            del self.tracks[tracker_id]
+            self.evicted_tracks += 1
+
+    def points(self, tracker_id: int) -> np.ndarray:
+        """ Stored positions of a track, newest first, shape (M, 2) """
+        track = self.tracks.get(tracker_id)
+        if track is None:
+            return np.empty((0, 2), dtype=np.int32)
+
+        buffer, index, count, _ = track
+        order = (index - 1 - np.arange(count)) % self.maxlen
+
+        return buffer[order]
+
+    def clear(self) -> None:
+        self.tracks.clear()
+
+    def stats(self) -> dict:
+        return {
+            'live_tracks': len(self.tracks),
+            'evicted_tracks': self.evicted_tracks,
+            'bytes_used': len(self.tracks) * self.track_bytes
+        }
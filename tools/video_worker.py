@@ -0,0 +1,276 @@
+from PySide6.QtCore import QThread, Signal
+
+import queue
+import threading
+from collections import deque
+
+from tools.frame_source import FrameSource
+from tools.keyframe_index import KeyframeIndex
+from tools.reverse_buffer import ReverseFrameBuffer
+from tools.pipeline import FramePipeline
+from tools.staged_pipeline import StagedPipeline
+
+
+class VideoWorker(QThread):
+    """ Background thread that decodes and processes requested frames
+
+    Frame requests go through a bounded queue. When the queue is full the
+    oldest pending request is dropped, so the displayed frame never lags
+    more than queue_size frames behind the last request.
+
+    During playback the worker runs a StagedPipeline instead, and processed
+    frames wait in a bounded display queue that the GUI drains with
+    next_frame() at the video frame rate.
+
+    The staged pipeline tracks frames ahead of the display. When playback is
+    paused those frames finish and are kept, and the next play or frame
+    request from the frame after the displayed one shows them first, so the
+    tracker keeps seeing frames in order. Playback starting anywhere else
+    behind the tracker resets it, see FramePipeline.restart_tracks.
+
+    Requests for a frame just before the last one processed are reverse
+    steps and are read from a ReverseFrameBuffer instead of seeking backwards.
+
+    A request or a playback that raises is reported with frame_failed and
+    the worker goes on with the next request.
+    """
+    frame_ready = Signal(int, object)
+    frame_failed = Signal(int, str)
+
+    def __init__(
+        self,
+        frame_source: FrameSource,
+        pipeline: FramePipeline,
+        queue_size: int = 2,
+        display_size: int = 4,
+        stage_workers: dict = None,
+        reverse_mb: int = 512
+    ):
+        """
+        Parameters
+        ----------
+            frame_source (FrameSource): Video frame source, owned by the worker once started
+            pipeline (FramePipeline): Detection, tracking and annotation pipeline
+            queue_size (int): Maximum number of pending frame requests
+            display_size (int): Maximum number of processed frames waiting for display
+            stage_workers (dict): Worker threads per stage during playback
+                Keys: 'infer', 'render'. Pipelines with a motion gate, a
+                scheduler or a replay index use one infer worker
+            reverse_mb (int): Memory cap of frames buffered for reverse playback
+        """
+        super().__init__()
+
+        self.frame_source = frame_source
+        self.pipeline = pipeline
+        self.requests = queue.Queue(maxsize=queue_size)
+        self.display = queue.Queue(maxsize=display_size)
+        self.stage_workers = stage_workers if stage_workers is not None else {}
+
+        # Reverse playback
+        self.reverse_buffer = ReverseFrameBuffer(frame_source.source, reverse_mb)
+        self.last_frame = None
+
+        # Playback
+        self.playing = False
+        self.playback_stop = threading.Event()
+        self.playback_stats = {}
+
+        # Frames processed past the displayed frame, in order, and the last frame shown
+        self.ahead = deque()
+        self.shown_frame = None
+
+        # Counters
+        self.processed_frames = 0
+        self.dropped_frames = 0
+        self.failed_requests = 0
+
+    def request_frame(self, frame_number: int) -> None:
+        """ Queue a frame for processing, dropping the oldest request if full """
+        while True:
+            try:
+                self.requests.put_nowait(frame_number)
+                return
+            except queue.Full:
+                try:
+                    self.requests.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def set_keyframe_index(self, keyframe_index: KeyframeIndex) -> None:
+        self.frame_source.set_keyframe_index(keyframe_index)
+        self.reverse_buffer.set_keyframe_index(keyframe_index)
+
+    def pending(self) -> int:
+        return self.requests.qsize()
+
+    def start_playback(self, frame_number: int) -> None:
+        """ Process frames continuously from frame_number through the staged pipeline """
+        self.stop_playback(keep_ahead=self.shown_frame is not None and frame_number == self.shown_frame + 1)
+        self.playback_stop = threading.Event()
+        self.playing = True
+        self.request_frame(('play', frame_number, self.playback_stop))
+
+    def stop_playback(self, keep_ahead: bool = True) -> None:
+        """ Stop playback
+
+        Parameters
+        ----------
+            keep_ahead (bool): Finish the frames already read and keep them with
+                the frames waiting for display for the next play or request.
+                False discards them
+        """
+        if not self.playback_stop.is_set():
+            self.playback_stop.keep_ahead = keep_ahead
+            self.playback_stop.set()
+        self.playing = False
+
+    def next_frame(self) -> tuple[int, object]:
+        """ Next processed playback frame, or None if none is ready yet """
+        try:
+            result = self.display.get_nowait()
+        except queue.Empty:
+            return None
+        self.shown_frame = result[0]
+        return result
+
+    def take_ahead(self, frame_number: int) -> list[tuple[int, object]]:
+        """ Frames processed ahead from frame_number on, if they start there, and forget the others """
+        ahead = []
+        while True:
+            try:
+                ahead.append(self.display.get_nowait())
+            except queue.Empty:
+                break
+        ahead.extend(self.ahead)
+        self.ahead.clear()
+
+        return ahead if ahead and ahead[0][0] == frame_number else []
+
+    def show(self, result: tuple[int, object], stop_event: threading.Event) -> bool:
+        """ Queue a playback frame for display, False if playback stopped first """
+        while not stop_event.is_set():
+            try:
+                self.display.put(result, timeout=0.05)
+                self.processed_frames += 1
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self) -> None:
+        """ Discard pending requests and finish the thread """
+        self.stop_playback(keep_ahead=False)
+        while not self.requests.empty():
+            try:
+                self.requests.get_nowait()
+            except queue.Empty:
+                break
+        self.requests.put(None)
+        self.wait()
+        self.reverse_buffer.release()
+
+    def run(self) -> None:
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+
+            try:
+                if isinstance(request, tuple):
+                    self.playback(*request[1:])
+                else:
+                    self.process(request)
+            except Exception as error:
+                self.failed_requests += 1
+                self.last_frame = None
+                if isinstance(request, tuple):
+                    frame_number, stop_event = request[1:]
+                    if stop_event is self.playback_stop:
+                        self.playing = False
+                else:
+                    frame_number = request
+                self.frame_failed.emit(frame_number, f"{type(error).__name__}: {error}")
+
+    def process(self, frame_number: int) -> None:
+        """ Decode and process a single requested frame """
+        ahead = self.take_ahead(frame_number)
+        if ahead:
+            self.ahead.extend(ahead[1:])
+            self.last_frame = frame_number
+            self.shown_frame = frame_number
+            self.frame_ready.emit(*ahead[0])
+            return
+
+        with self.pipeline.profile('decode'):
+            if self.last_frame is not None and 0 < self.last_frame - frame_number <= self.requests.maxsize:
+                success, image = self.reverse_buffer.read(frame_number)
+            else:
+                success, image = self.frame_source.read(frame_number)
+        if not success:
+            return
+        self.last_frame = frame_number
+
+        annotated_image, _, _ = self.pipeline.process(image, frame_number)
+        self.processed_frames += 1
+        self.shown_frame = frame_number
+        self.frame_ready.emit(frame_number, annotated_image)
+
+    def playback(self, frame_number: int, stop_event: threading.Event) -> None:
+        # Frames tracked before the last pause go first, the pipeline goes on after them
+        ahead = deque(self.take_ahead(frame_number))
+        while ahead:
+            if not self.show(ahead[0], stop_event):
+                self.end_playback(stop_event, list(ahead))
+                return
+            frame_number = ahead.popleft()[0] + 1
+        self.pipeline.restart_tracks(frame_number)
+
+        stages = self.pipeline.stages(
+            self.frame_source,
+            infer_workers=self.stage_workers.get('infer', 1),
+            render_workers=self.stage_workers.get('render', 1)
+        )
+        staged_pipeline = StagedPipeline(stages)
+        staged_pipeline.start(range(frame_number, self.frame_source.total_frames))
+
+        held = []
+        try:
+            for result in staged_pipeline.results():
+                if stop_event.is_set() or not self.show(result, stop_event):
+                    if not stop_event.keep_ahead:
+                        break
+                    # Paused, frames already read still go through tracking and are kept
+                    staged_pipeline.finish()
+                    held.append(result)
+        except EOFError:
+            pass
+        finally:
+            self.last_frame = None
+            self.playback_stats = staged_pipeline.stats()
+            staged_pipeline.stop()
+            self.end_playback(stop_event, held)
+
+    def end_playback(self, stop_event: threading.Event, held: list[tuple[int, object]]) -> None:
+        """ Keep the frames of a paused playback not displayed yet, those waiting for display first """
+        if stop_event.is_set():
+            waiting = []
+            while True:
+                try:
+                    waiting.append(self.display.get_nowait())
+                except queue.Empty:
+                    break
+            if stop_event.keep_ahead:
+                self.ahead = deque(waiting + held)
+        if stop_event is self.playback_stop:
+            self.playing = False
+
+    def stats(self) -> dict:
+        return {
+            'processed': self.processed_frames,
+            'dropped': self.dropped_frames,
+            'failed': self.failed_requests,
+            'pending': self.pending(),
+            'playback': self.playback_stats,
+            'reverse': self.reverse_buffer.stats()
+        }
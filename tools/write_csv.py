@@ -1,10 +1,11 @@
 import csv
+import time
+import numpy as np
 from supervision.detection.core import Detections
 
 
-
 def csv_detections_list(data: list, frame_number: int, detections: Detections, class_names) -> list:
-    for xyxy, _, confidence, class_id, _ in detections:
+    for xyxy, confidence, class_id in zip(detections.xyxy, detections.confidence, detections.class_id):
         x = int(xyxy[0])
         y = int(xyxy[1])
         w = int(xyxy[2]-xyxy[0])
@@ -18,7 +19,7 @@ def csv_detections_list(data: list, frame_number: int, detections: Detections, c
 
 
 def csv_tracks_list(data: list, frame_number: int, tracks, class_names) -> list:
-    for xyxy, _, _, class_id, tracker_id in tracks:
+    for xyxy, class_id, tracker_id in zip(tracks.xyxy, tracks.class_id, tracks.tracker_id):
         x = int(xyxy[0])
         y = int(xyxy[1])
         w = int(xyxy[2]-xyxy[0])
@@ -35,4 +36,111 @@ def write_csv(save_path: str, data: list) -> None:
     with open(save_path, 'a', newline='') as csv_file:
         csv_writer = csv.writer(csv_file)
         csv_writer.writerows(data)
-        
\ No newline at end of file
+        
+
+class ResultsWriter:
+    """ Streaming CSV writer of detections and tracks
+
+    The file stays open and rows are buffered as text. A whole Detections
+    object is formatted at once from its arrays. The buffer is written out
+    every flush_rows rows or flush_seconds seconds, and on close. Rows match
+    the ones of csv_detections_list and csv_tracks_list written by
+    write_csv.
+    """
+    def __init__(self, save_path: str, class_names: dict, flush_rows: int = 10000, flush_seconds: float = 5.0, mode: str = 'a'):
+        """
+        Parameters
+        ----------
+            save_path (str): CSV file path
+            class_names (dict): Class names by class id
+            flush_rows (int): Buffered rows that trigger a flush
+            flush_seconds (float): Time since the last flush that triggers a flush
+            mode (str): File mode, 'a' appends, 'w' overwrites and 'x' fails if the file exists
+        """
+        self.save_path = save_path
+        self.class_names = class_names
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.file = open(save_path, mode, newline='')
+
+        self.buffer = []
+        self.buffered_rows = 0
+        self.last_flush = time.perf_counter()
+
+        # Counters
+        self.rows = 0
+        self.flushes = 0
+
+    def __enter__(self) -> 'ResultsWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _names(self, class_id: np.ndarray) -> np.ndarray:
+        unique_ids, inverse = np.unique(class_id, return_inverse=True)
+        return np.array([self.class_names[class_id] for class_id in unique_ids], dtype=object)[inverse]
+
+    def _write(self, row_format: str, table: np.ndarray) -> None:
+        self.buffer.append((row_format * len(table)) % tuple(table.ravel().tolist()))
+        self.buffered_rows += len(table)
+        self.rows += len(table)
+        if self.buffered_rows >= self.flush_rows or time.perf_counter() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def _boxes(self, detections: Detections) -> np.ndarray:
+        """ Object table of class name, x, y, w and h columns """
+        xyxy = detections.xyxy
+        table = np.empty((len(detections), 5), dtype=object)
+        table[:, 0] = self._names(detections.class_id)
+        table[:, 1] = xyxy[:, 0].astype(int)
+        table[:, 2] = xyxy[:, 1].astype(int)
+        table[:, 3] = (xyxy[:, 2] - xyxy[:, 0]).astype(int)
+        table[:, 4] = (xyxy[:, 3] - xyxy[:, 1]).astype(int)
+
+        return table
+
+    def write_detections(self, frame_number: int, detections: Detections) -> None:
+        """ Buffer a row per detection: frame, class, x, y, w, h, confidence """
+        if len(detections) == 0:
+            return
+
+        boxes = self._boxes(detections)
+        confidence = detections.confidence.astype(str)[:, None]
+        if frame_number is None:
+            self._write('%s,%d,%d,%d,%d,%s\r\n', np.hstack([boxes, confidence]))
+        else:
+            frames = np.full((len(detections), 1), frame_number, dtype=object)
+            self._write('%d,%s,%d,%d,%d,%d,%s\r\n', np.hstack([frames, boxes, confidence]))
+
+    def write_tracks(self, frame_number: int, tracks: Detections) -> None:
+        """ Buffer a row per track: frame, tracker id, class, x, y, w, h """
+        if len(tracks) == 0:
+            return
+
+        table = np.empty((len(tracks), 7), dtype=object)
+        table[:, 0] = frame_number
+        table[:, 1] = tracks.tracker_id.astype(int)
+        table[:, 2:] = self._boxes(tracks)
+        self._write('%d,%d,%s,%d,%d,%d,%d,\r\n', table)
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.file.write(''.join(self.buffer))
+            self.file.flush()
+            self.buffer.clear()
+            self.flushes += 1
+        self.buffered_rows = 0
+        self.last_flush = time.perf_counter()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def stats(self) -> dict:
+        return {
+            'rows': self.rows,
+            'flushes': self.flushes,
+            'buffered_rows': self.buffered_rows
+        }